@@ -1,173 +1,280 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from app.auth import require_role
-from app.db import audit_logs, users_collection, settings_collection
+from app import db_async
+from app.db import audit_logs
+from app.utils.audit_logger import parse_timestamp, iso_timestamp
+from app.utils.audit_search import search_query
+from app.utils import audit_rollups, audit_retention
+from app.utils.cache import TTLCache
+from app.utils.pagination import decode_cursor, encode_cursor, seek_after
 from datetime import datetime
 import csv
+import json
+from itertools import chain
+import zlib
 from io import StringIO
 
 router = APIRouter(prefix="/admin/audit", tags=["Admin"])
 
+# exact totals are expensive on large collections; reuse them for a short while
+_total_cache = TTLCache(maxsize=128, ttl=30)
 
-@router.get("")
-def list_audit_logs(
-    event: str = None,
-    actor: str = None,
-    patient_id: str = None,
-    role: str = None,
-    from_ts: str = None,
-    to_ts: str = None,
-    q: str = None,
-    status: str = None,
-    limit: int = 50,
-    skip: int = 0,
-    user=Depends(require_role("admin"))
-):
-    """List audit logs with filters, search and pagination"""
+
+STATUS_ERROR_VARIANTS = ["Failed", "failed", "FAILED", "Error", "error", "ERROR"]
+
+
+def _build_query(filters: dict):
+    """Translate list/export filters into a Mongo query.
+
+    Equality filters (event, actor, patient_id, role) are combined with the
+    timestamp range so the compound (field, timestamp) indexes can serve them.
+    """
     query = {}
-    if event:
-        query["event"] = event
-    if actor:
-        query["actor"] = actor
-    if patient_id:
-        query["patient_id"] = patient_id
-    if role:
-        query["role"] = role
-
-    # text search across common fields
-    if q:
-        query["$or"] = [
-            {"event": {"$regex": q, "$options": "i"}},
-            {"actor": {"$regex": q, "$options": "i"}},
-            {"role": {"$regex": q, "$options": "i"}},
-            {"detail.action": {"$regex": q, "$options": "i"}},
-            {"detail.note": {"$regex": q, "$options": "i"}}
-        ]
+    for k in ("event", "actor", "patient_id", "role"):
+        if filters.get(k):
+            query[k] = filters.get(k)
+
+    # substring search across common fields, narrowed through the trigram index
+    q = filters.get("q")
+    if q and q.strip():
+        query.update(search_query(q))
 
     # status filter
+    status = filters.get("status")
     if status:
         # map 'Error' to failed/error variants for compatibility with UI
         st = status.strip().lower()
         if st == 'error':
-            query["detail.status"] = {"$in": ["Failed", "failed", "FAILED", "Error", "error", "ERROR"]}
+            query["detail.status"] = {"$in": STATUS_ERROR_VARIANTS}
         else:
             # match various casings
             query["detail.status"] = {"$in": [status, status.lower(), status.upper(), status.capitalize()]}
 
+    from_ts = filters.get("from_ts")
+    to_ts = filters.get("to_ts")
     if from_ts or to_ts:
+        # timestamps are stored as BSON dates; compare against datetimes, never strings
         time_query = {}
-        try:
-            if from_ts:
-                time_query["$gte"] = datetime.fromisoformat(from_ts)
-            if to_ts:
-                time_query["$lte"] = datetime.fromisoformat(to_ts)
-            query["timestamp"] = time_query
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use ISO format.")
-    total = audit_logs.count_documents(query)
-    cursor = audit_logs.find(query).sort("timestamp", -1).skip(skip).limit(limit)
+        for op, raw in (("$gte", from_ts), ("$lte", to_ts)):
+            if not raw:
+                continue
+            parsed = parse_timestamp(raw)
+            if parsed is None:
+                raise HTTPException(status_code=400, detail="Invalid date format. Use ISO format.")
+            time_query[op] = parsed
+        query["timestamp"] = time_query
+
+    return query
+
+
+async def _count_total(query: dict):
+    """Total matching entries: estimated when unfiltered, otherwise a cached exact count."""
+    if not query:
+        return await db_async.audit_logs.estimated_document_count()
+    key = repr(sorted(query.items(), key=lambda kv: kv[0]))
+    total = _total_cache.get(key)
+    if total is None:
+        total = await db_async.audit_logs.count_documents(query)
+        _total_cache.set(key, total)
+    return total
+
+
+@router.get("")
+async def list_audit_logs(
+    event: str = None,
+    actor: str = None,
+    patient_id: str = None,
+    role: str = None,
+    from_ts: str = None,
+    to_ts: str = None,
+    q: str = None,
+    status: str = None,
+    limit: int = 50,
+    skip: int = 0,
+    cursor: str = None,
+    include_total: bool = True,
+    user=Depends(require_role("admin"))
+):
+    """List audit logs with filters, search and pagination.
+
+    Pass the returned `next_cursor` as `cursor` to fetch the next page; this
+    seeks on (timestamp, _id) instead of skipping, so deep pages stay cheap.
+    `skip` is still honoured when no cursor is given. `total` is estimated or
+    cached and can be turned off with `include_total=false`.
+    """
+    query = _build_query({
+        "event": event,
+        "actor": actor,
+        "patient_id": patient_id,
+        "role": role,
+        "q": q,
+        "status": status,
+        "from_ts": from_ts,
+        "to_ts": to_ts
+    })
+    limit = max(1, min(limit, 500))
+    total = await _count_total(query) if include_total else None
+
+    page_query = query
+    if cursor:
+        ts, oid = decode_cursor(cursor)
+        after = seek_after("timestamp", ts, oid)
+        page_query = {"$and": [query, after]} if query else after
+
+    rows = db_async.audit_logs.find(page_query, {"search_grams": 0, "search_grams_partial": 0}).sort([("timestamp", -1), ("_id", -1)])
+    if not cursor and skip:
+        rows = rows.skip(skip)
+    # fetch one extra row to know whether another page exists
+    rows = await rows.limit(limit + 1).to_list(limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
     events = []
-    for d in cursor:
-        d["_id"] = str(d.get("_id"))
+    for d in rows:
         # do not include raw detail that might have PHI; detail is already sanitized by logger
         events.append({
-            "_id": d["_id"],
+            "_id": str(d.get("_id")),
             "event": d.get("event"),
             "actor": d.get("actor"),
             "role": d.get("role"),
             "patient_id": d.get("patient_id"),
             "detail": d.get("detail"),
-            "timestamp": d.get("timestamp")
+            "timestamp": iso_timestamp(d.get("timestamp"))
         })
 
-    return {"total": total, "events": events, "limit": limit, "skip": skip}
+    next_cursor = encode_cursor(rows[-1].get("timestamp"), rows[-1]["_id"]) if has_more and rows else None
+
+    return {
+        "total": total,
+        "events": events,
+        "limit": limit,
+        "skip": skip,
+        "next_cursor": next_cursor
+    }
 
 
 @router.get("/events")
-def distinct_events(user=Depends(require_role("admin"))):
-    keys = audit_logs.distinct("event")
+async def distinct_events(user=Depends(require_role("admin"))):
+    keys = await db_async.audit_logs.distinct("event")
     return {"events": keys}
 
 
-@router.post("/export")
-def export_audit_logs(filters: dict = {}, user=Depends(require_role("admin"))):
-    # Reuse list logic but return CSV
-    # Accepts filters in JSON body
-    query = {}
-    for k in ("event", "actor", "patient_id", "role"):
-        if filters.get(k):
-            query[k] = filters.get(k)
+EXPORT_COLUMNS = ["timestamp", "event", "actor", "role", "patient_id", "detail"]
+EXPORT_PROJECTION = {"_id": 0, "timestamp": 1, "event": 1, "actor": 1, "role": 1, "patient_id": 1, "detail": 1}
+EXPORT_BATCH_SIZE = 1000
 
-    # q and status support in export as well
-    if filters.get("q"):
-        q = filters.get("q")
-        query["$or"] = [
-            {"event": {"$regex": q, "$options": "i"}},
-            {"actor": {"$regex": q, "$options": "i"}},
-            {"role": {"$regex": q, "$options": "i"}},
-            {"detail.action": {"$regex": q, "$options": "i"}},
-            {"detail.note": {"$regex": q, "$options": "i"}}
-        ]
-
-    if filters.get("status"):
-        st = filters.get("status").strip().lower()
-        if st == 'error':
-            query["detail.status"] = {"$in": ["Failed", "failed", "FAILED", "Error", "error", "ERROR"]}
+
+def _export_rows(cursor, fmt: str):
+    """Yield encoded export chunks, one cursor batch at a time."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    if fmt == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+
+    pending = 0
+    for d in cursor:
+        ts = iso_timestamp(d.get("timestamp"))
+        if fmt == "csv":
+            writer.writerow([ts, d.get("event"), d.get("actor"), d.get("role"),
+                             d.get("patient_id"), str(d.get("detail"))])
         else:
-            query["detail.status"] = {"$in": [filters.get("status"), filters.get("status").lower(), filters.get("status").upper(), filters.get("status").capitalize()]}
+            row = {k: d.get(k) for k in EXPORT_COLUMNS}
+            row["timestamp"] = ts
+            buf.write(json.dumps(row, default=str))
+            buf.write("\n")
 
-    if filters.get("from_ts") or filters.get("to_ts"):
-        time_query = {}
-        try:
-            if filters.get("from_ts"):
-                time_query["$gte"] = datetime.fromisoformat(filters.get("from_ts"))
-            if filters.get("to_ts"):
-                time_query["$lte"] = datetime.fromisoformat(filters.get("to_ts"))
-            query["timestamp"] = time_query
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid date format. Use ISO format.")
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+            pending = 0
 
-    cursor = audit_logs.find(query).sort("timestamp", -1).limit(10000)
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
 
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["timestamp", "event", "actor", "role", "patient_id", "detail"])
 
-    for d in cursor:
-        writer.writerow([
-            d.get("timestamp"),
-            d.get("event"),
-            d.get("actor"),
-            d.get("role"),
-            d.get("patient_id"),
-            str(d.get("detail"))
-        ])
+def _gzip_stream(chunks):
+    # wbits=31 -> gzip container, compressed incrementally
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
 
-    return {"csv": output.getvalue()}
 
+@router.post("/export")
+def export_audit_logs(filters: dict = {}, user=Depends(require_role("admin"))):
+    """Stream every matching audit entry as CSV (default) or NDJSON.
 
-@router.get("/stats")
-def audit_stats(user=Depends(require_role("admin"))):
-    total = audit_logs.count_documents({})
-    # counts by event
-    pipeline = [
-        {"$group": {"_id": "$event", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]
-    by_event = list(audit_logs.aggregate(pipeline))
+    Body: the list filters plus optional `format` ("csv" | "ndjson"),
+    `gzip` (bool) and `include_archive` (bool, also read entries already
+    moved out by the retention pruner). Rows are written as the cursor is
+    consumed, so memory stays flat regardless of how many entries match.
+    """
+    fmt = (filters.get("format") or "csv").lower()
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Invalid export format")
+
+    query = _build_query(filters)
 
-    # counts by status (detail.status) - be permissive about casing
-    success = audit_logs.count_documents({"detail.status": {"$in": ["Success", "success", "SUCCESS"]}})
-    warning = audit_logs.count_documents({"detail.status": {"$in": ["Warning", "warning", "WARNING"]}})
-    failed = audit_logs.count_documents({"detail.status": {"$in": ["Failed", "failed", "FAILED", "Error", "error", "ERROR"]}})
+    cursor = audit_logs.find(query, EXPORT_PROJECTION) \
+        .sort([("timestamp", -1), ("_id", -1)]) \
+        .batch_size(EXPORT_BATCH_SIZE)
 
-    return {"total": total, "by_event": by_event, "success": success, "warning": warning, "failed": failed}
+    rows = cursor
+    if filters.get("include_archive"):
+        # archived entries are all older than the hot ones, so ordering holds
+        rows = chain(cursor, audit_retention.iter_archived(filters))
+
+    body = _export_rows(rows, fmt)
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    filename = f"audit_export.{fmt}"
+
+    if filters.get("gzip"):
+        body = _gzip_stream(body)
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/stats")
+async def audit_stats(user=Depends(require_role("admin"))):
+    # read the hourly rollups instead of scanning audit_logs
+    totals = await audit_rollups.aread_totals()
+    by_event = sorted(
+        ({"_id": k, "count": v} for k, v in totals["events"].items()),
+        key=lambda e: e["count"],
+        reverse=True
+    )
+    status = totals["status"]
+
+    return {
+        "total": totals["total"],
+        "by_event": by_event,
+        "success": status.get("success", 0),
+        "warning": status.get("warning", 0),
+        "failed": status.get("failed", 0)
+    }
 
 
 @router.get("/roles")
-def roles_stats(user=Depends(require_role("admin"))):
-    # compute distinct roles and counts
-    roles = users_collection.distinct("role")
+async def roles_stats(user=Depends(require_role("admin"))):
+    # compute distinct roles and counts in one pass
+    counts = {
+        d["_id"]: d["count"]
+        for d in await db_async.users_collection.aggregate([
+            {"$group": {"_id": "$role", "count": {"$sum": 1}}}
+        ]).to_list(None)
+    }
+    roles = [r for r in counts if r is not None]
     total_roles = len(roles)
     # include 'auditor' as a known system role
     system_role_set = {"doctor", "nurse", "admin", "auditor"}
@@ -196,7 +303,7 @@ def roles_stats(user=Depends(require_role("admin"))):
 
     role_counts = []
     for r in roles:
-        cnt = users_collection.count_documents({"role": r})
+        cnt = counts[r]
         meta = ROLE_META.get(str(r).lower(), {})
         role_counts.append({
             "role": r,
@@ -212,7 +319,7 @@ def roles_stats(user=Depends(require_role("admin"))):
 # ⚙️ System Settings (persisted)
 # ---------------------------------
 @router.get("/settings")
-def get_settings(user=Depends(require_role("admin"))):
+async def get_settings(user=Depends(require_role("admin"))):
     """Return current system settings or defaults"""
     defaults = {
         "phi_sensitivity": "Medium",
@@ -221,7 +328,7 @@ def get_settings(user=Depends(require_role("admin"))):
         "student_mode": "Disabled"
     }
 
-    s = settings_collection.find_one({"_id": "system"})
+    s = await db_async.settings_collection.find_one({"_id": "system"})
     if not s:
         return defaults
 
@@ -234,12 +341,12 @@ def get_settings(user=Depends(require_role("admin"))):
 
 
 @router.post("/settings")
-def set_settings(payload: dict, user=Depends(require_role("admin"))):
+async def set_settings(payload: dict, user=Depends(require_role("admin"))):
     """Persist system settings (upsert)"""
     # validate keys and simple value checks
     allowed_phi = {"Low", "Medium", "High"}
     allowed_timeouts = {"15 minutes", "30 minutes", "60 minutes"}
-    allowed_retention = {"30 days", "90 days", "1 year"}
+    allowed_retention = set(audit_retention.RETENTION_DAYS)
     allowed_student = {"Disabled", "Enabled"}
 
     phi = payload.get("phi_sensitivity")
@@ -267,6 +374,6 @@ def set_settings(payload: dict, user=Depends(require_role("admin"))):
         "updated_at": datetime.utcnow()
     }
 
-    settings_collection.update_one({"_id": "system"}, {"$set": settings_doc}, upsert=True)
+    await db_async.settings_collection.update_one({"_id": "system"}, {"$set": settings_doc}, upsert=True)
 
     return {"ok": True, "settings": settings_doc}
\ No newline at end of file
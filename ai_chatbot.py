@@ -1,47 +1,93 @@
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from app.auth import require_role
 from app.schemas import AskRequest
 from app.ai.retriever import retrieve_patient_docs
-from app.ai.answer_engine import generate_answer
+from app.ai.answer_engine import generate_answer, stream_answer
+from app.ai.vector_store import vector_store
+from app.ai import llm_client
+from app import db_async
+from app.config import ASK_CACHE_TTL_SECONDS, ASK_CACHE_MAX_ENTRIES
+from app.db_indexes import PATIENT_VERSION_PROJECTION
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/ai", tags=["AI"])
 
 from app.utils.audit_logger import log_audit
+from app.utils import executors
+from app.utils.cache import TTLCache
 
+# answers keyed by (patient_id, normalized question, vector version); storing a new
+# vector for the patient changes the version, so re-embeds invalidate automatically.
+# Without vectors the retriever falls back to the latest record, so that record's
+# version is part of the key instead.
+_answer_cache = TTLCache(maxsize=ASK_CACHE_MAX_ENTRIES, ttl=ASK_CACHE_TTL_SECONDS)
 
-@router.post("/ask")
-def ask_ai(
-    data: AskRequest,
-    user=Depends(require_role("doctor"))
-):
+
+def _normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+async def _cache_key(data: AskRequest):
+    version = vector_store.version(data.patient_id)
+    if version == "0":
+        # index-only probe of the record the retriever falls back to
+        latest = await db_async.patients_collection.find_one(
+            {"patient_id": data.patient_id}, PATIENT_VERSION_PROJECTION, sort=[("created_at", -1)]
+        )
+        version = ("fallback", *sorted((latest or {}).items()))
+    return (data.patient_id, _normalize_question(data.question), version)
+
+
+async def _audit_query(data: AskRequest, user, action: str):
     # Persist an audit record of the AI query in a PHI-safe manner
     try:
         actor = user.get("username") if isinstance(user, dict) else str(user)
         role = user.get("role") if isinstance(user, dict) else None
-        log_audit(
+        await run_in_threadpool(
+            log_audit,
             event="AI_QUERY",
             actor=actor,
             role=role,
             patient_id=data.patient_id,
-            detail={"action": "AI_ASK", "note": data.question}
+            detail={"action": action, "note": data.question}
         )
     except Exception:
         # fail-safe: don't block the response on audit failure
         pass
 
-    retrieved_docs = retrieve_patient_docs(
-        patient_id=data.patient_id,
-        question=data.question
+
+@router.post("/ask")
+async def ask_ai(
+    data: AskRequest,
+    user=Depends(require_role("doctor"))
+):
+    await _audit_query(data, user, "AI_ASK")
+
+    # identical concurrent questions share one computation; repeats hit the cache
+    return await _answer_cache.aget_or_set(await _cache_key(data), lambda: _answer(data.patient_id, data.question))
+
+
+async def _retrieve(patient_id: str, question: str):
+    """Retrieved docs plus their plain texts for generation."""
+    # query embedding + similarity search on the inference pool
+    retrieved_docs = await executors.inference.run(
+        retrieve_patient_docs,
+        patient_id=patient_id,
+        question=question
     )
 
     # extract plain text for generation, but preserve sources for response
     texts = [d["text"] for d in retrieved_docs] if isinstance(retrieved_docs, list) and retrieved_docs and isinstance(retrieved_docs[0], dict) else retrieved_docs
+    return retrieved_docs, texts
 
-    answer = generate_answer(
-        question=data.question,
-        retrieved_docs=texts
-    )
 
+def _attribution(retrieved_docs, patient_id: str) -> dict:
     # Build sources, matches (with scores), and patient history used
     sources = []
     matches = []
@@ -60,17 +106,150 @@ def ask_ai(
                     if src and str(src).startswith("PAT-"):
                         patients_used.add(src)
         # always include the requested patient id as used
-        patients_used.add(data.patient_id)
+        patients_used.add(patient_id)
     except Exception:
         pass
 
     if not sources:
-        sources = [data.patient_id]
+        sources = [patient_id]
 
     return {
-        "answer": answer,
         "sources": sources,
         "matches": matches,
-        "patients_used": list(patients_used),
+        "patients_used": list(patients_used)
+    }
+
+
+async def _answer(patient_id: str, question: str) -> dict:
+    retrieved_docs, texts = await _retrieve(patient_id, question)
+
+    # redaction-heavy answer generation on the process pool
+    answer = await executors.redaction.run(
+        generate_answer,
+        question=question,
+        retrieved_docs=texts
+    )
+
+    return {
+        "answer": answer,
+        **_attribution(retrieved_docs, patient_id),
         "safe": True
-    }
\ No newline at end of file
+    }
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class _StreamFlight:
+    """One streamed answer in progress; every request for the same key replays its events."""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def emit(self, event: str, data):
+        self.events.append((event, data))
+        self._wake()
+
+    def finish(self):
+        self.done = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def replay(self):
+        i = 0
+        while True:
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+
+# concurrent /ai/ask/stream requests for one key share a single generation
+_stream_flights = {}
+
+
+async def _produce(key, flight: _StreamFlight, question: str, texts, attribution: dict):
+    flight.emit("sources", attribution)
+    answer = {}
+    try:
+        async for name, value in stream_answer(question, texts, executors.redaction.run):
+            if name == "summary_delta":
+                flight.emit("delta", {"section": "summary", "text": value})
+                continue
+            answer[name] = value
+            flight.emit("section", {"name": name, "value": value})
+    except Exception as e:
+        logger.exception("streaming answer failed")
+        detail = e.detail if hasattr(e, "detail") else "Answer generation failed"
+        flight.emit("error", {"detail": detail})
+    else:
+        _answer_cache.set(key, {"answer": answer, **attribution, "safe": True})
+        flight.emit("done", {"safe": True})
+    finally:
+        flight.finish()
+        _stream_flights.pop(key, None)
+
+
+@router.post("/ask/stream")
+async def ask_ai_stream(
+    data: AskRequest,
+    user=Depends(require_role("doctor"))
+):
+    """Streaming variant of /ai/ask (Server-Sent Events over a POST response).
+
+    Events, in order:
+      sources  {sources, matches, patients_used} as soon as retrieval finishes
+      delta    {section, text} answer text chunks, when an LLM stream backend is set
+      section  {name, value} for summary, patterns, red_flags, follow_up, note
+      done     {safe}
+      error    {detail} if generation fails mid-stream
+    A cached answer for the same question is replayed immediately, and
+    concurrent requests for the same question share one generation. With
+    an LLM stream backend the summary differs from /ai/ask's, so those
+    answers are cached under their own key.
+    """
+    await _audit_query(data, user, "AI_ASK_STREAM")
+
+    key = await _cache_key(data)
+    if llm_client.has_stream_backend():
+        key = (*key, "llm")
+
+    cached = _answer_cache.get(key)
+    flight = _stream_flights.get(key) if cached is None else None
+    if cached is None and flight is None:
+        # retrieval happens before the response starts, so pool saturation is still a 503
+        retrieved_docs, texts = await _retrieve(data.patient_id, data.question)
+        # another request may have started the same generation while this one retrieved
+        flight = _stream_flights.get(key)
+        if flight is None:
+            flight = _stream_flights[key] = _StreamFlight()
+            # not tied to this response: a disconnect must not cut off the other listeners
+            flight.task = asyncio.ensure_future(
+                _produce(key, flight, data.question, texts, _attribution(retrieved_docs, data.patient_id))
+            )
+
+    async def stream():
+        if cached is not None:
+            yield _sse("sources", {k: cached[k] for k in ("sources", "matches", "patients_used")})
+            for name, value in cached["answer"].items():
+                yield _sse("section", {"name": name, "value": value})
+            yield _sse("done", {"safe": True})
+            return
+
+        async for event, payload in flight.replay():
+            yield _sse(event, payload)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
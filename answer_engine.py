@@ -1,4 +1,9 @@
+import asyncio
 from app.services.phi_cleaner import redact_text
+from app.ai import llm_client
+
+# answer sections in the order they are streamed (see stream_answer)
+SECTIONS = ("summary", "patterns", "red_flags", "follow_up")
 
 
 def generate_answer(question: str, retrieved_docs: list[str]) -> dict:
@@ -102,3 +107,46 @@ def generate_answer(question: str, retrieved_docs: list[str]) -> dict:
         "follow_up": sorted(follow_up),
         "note": note
     }
+
+
+def redact_docs(retrieved_docs: list[str]) -> list[str]:
+    return [redact_text(d) for d in retrieved_docs]
+
+
+def build_summary_prompt(question: str, cleaned_docs: list[str]) -> str:
+    context = "\n---\n".join(cleaned_docs)
+    return (
+        "Summarize the de-identified patient records below as they relate to the question. "
+        "Do not diagnose or prescribe.\n\n"
+        f"Question: {question}\n\nRecords:\n{context}\n\nSummary:"
+    )
+
+
+async def stream_answer(question: str, retrieved_docs: list[str], run):
+    """Async generator of (section, value) pairs in SECTIONS order, then ("note", ...).
+
+    `run(fn, **kwargs)` executes blocking work off the event loop (the
+    redaction pool). The rule-based sections are computed in the background
+    while, if an LLM stream backend is registered, the summary streams from
+    it as ("summary_delta", chunk) pairs before the final ("summary", text).
+    """
+    analysis = asyncio.ensure_future(run(generate_answer, question=question, retrieved_docs=retrieved_docs))
+    try:
+        if retrieved_docs and llm_client.has_stream_backend():
+            cleaned = await run(redact_docs, retrieved_docs=retrieved_docs)
+            parts = []
+            async for chunk in llm_client.stream_llm(build_summary_prompt(question, cleaned)):
+                parts.append(chunk)
+                yield "summary_delta", chunk
+            summary = "".join(parts)
+        else:
+            summary = (await analysis)["summary"]
+        yield "summary", summary
+
+        result = await analysis
+        for section in SECTIONS[1:]:
+            yield section, result[section]
+        yield "note", result["note"]
+    finally:
+        # client went away mid-stream: don't leave the analysis running
+        analysis.cancel()
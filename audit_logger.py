@@ -1,9 +1,14 @@
+import logging
 from datetime import datetime, timezone
 from app.db import audit_logs
 from app.services.phi_cleaner import redact_text
+from app.utils.audit_search import search_fields
+from app.utils import audit_rollups, event_bus
+
+logger = logging.getLogger(__name__)
 
 # Allowed detail keys (others will be stringified but sanitized)
-ALLOWED_DETAIL_KEYS = {"note", "action", "vector_id", "status"}
+ALLOWED_DETAIL_KEYS = {"note", "action", "vector_id", "status", "ip"}
 
 
 def _sanitize_detail(detail):
@@ -39,7 +44,7 @@ def log_audit(event: str, actor: str, role: str, patient_id: str = None, detail=
       - role (str)
       - patient_id (optional)
       - detail (sanitized)
-      - timestamp (utc)
+      - timestamp (utc, BSON date)
     """
     if not event or not actor or not role:
         raise ValueError("event, actor and role are required")
@@ -50,9 +55,55 @@ def log_audit(event: str, actor: str, role: str, patient_id: str = None, detail=
         "role": role,
         "patient_id": patient_id,
         "detail": _sanitize_detail(detail),
-        # store timestamp as explicit UTC ISO string (e.g., 2025-12-28T05:23:25+00:00)
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        # store timestamp as a native BSON date (UTC) so range filters hit the index
+        "timestamp": datetime.now(timezone.utc)
     }
 
-    # insert and return result
-    return audit_logs.insert_one(entry)
+    # trigram set backing the admin audit search (see app.utils.audit_search)
+    entry.update(search_fields(entry))
+
+    result = audit_logs.insert_one(entry)
+
+    # keep stats rollups current; a counter failure must never lose the audit entry
+    try:
+        audit_rollups.record(entry)
+    except Exception:
+        logger.exception("Failed to update audit rollups")
+
+    # push to live dashboards (same shape as /dashboard/activity)
+    detail = entry["detail"] if isinstance(entry["detail"], dict) else {}
+    event_bus.publish("audit", {
+        "actor": actor,
+        "event": detail.get("action") or event,
+        "timestamp": entry["timestamp"].isoformat()
+    })
+
+    return result
+
+
+def parse_timestamp(ts):
+    """Coerce a stored or user-supplied timestamp into an aware UTC datetime.
+
+    Accepts datetimes (naive values are assumed UTC, which is how pymongo
+    returns BSON dates) and ISO-8601 strings including a trailing 'Z'.
+    Returns None when the value cannot be parsed.
+    """
+    if isinstance(ts, datetime):
+        if ts.tzinfo is None:
+            return ts.replace(tzinfo=timezone.utc)
+        return ts.astimezone(timezone.utc)
+    if isinstance(ts, str) and ts:
+        try:
+            parsed = datetime.fromisoformat(ts.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parse_timestamp(parsed)
+    return None
+
+
+def iso_timestamp(ts):
+    """Render an audit timestamp as a UTC ISO string for API responses."""
+    parsed = parse_timestamp(ts)
+    if parsed is None:
+        return str(ts) if ts is not None else None
+    return parsed.isoformat()
@@ -0,0 +1,216 @@
+# app/utils/audit_retention.py
+"""Audit log retention: archive expired entries to disk, then prune them.
+
+The `audit_log_retention` system setting decides how long entries stay in
+the hot `audit_logs` collection. A background pruner periodically moves
+older entries into gzip-compressed NDJSON files partitioned by UTC day
+(`<AUDIT_ARCHIVE_DIR>/YYYY/MM/YYYY-MM-DD.ndjson.gz`) and only then deletes
+them from Mongo. The export endpoint can read those files back through
+`iter_archived`.
+
+Every API worker starts a pruner, but only one may run at a time: a run
+first takes a lease document in `settings` (`audit_retention_lease`) and
+renews it before each batch, stopping if it was lost. Two workers can
+therefore never append to the same day file or prune the same range
+concurrently.
+"""
+import gzip
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError
+from app.config import AUDIT_ARCHIVE_DIR, AUDIT_PRUNE_INTERVAL_SECONDS, AUDIT_PRUNE_LEASE_SECONDS
+from app.db import audit_logs, settings_collection
+from app.utils.audit_logger import parse_timestamp
+from app.utils.audit_search import SEARCH_FIELDS
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS = {"30 days": 30, "90 days": 90, "1 year": 365}
+DEFAULT_RETENTION = "90 days"
+PRUNE_BATCH_SIZE = 1000
+
+LEASE_ID = "audit_retention_lease"
+
+_stop = threading.Event()
+_thread = None
+_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def retention_cutoff(now=None):
+    """Oldest timestamp that stays in the hot collection under the current setting."""
+    s = settings_collection.find_one({"_id": "system"}, {"audit_log_retention": 1}) or {}
+    days = RETENTION_DAYS.get(s.get("audit_log_retention"), RETENTION_DAYS[DEFAULT_RETENTION])
+    return (now or datetime.now(timezone.utc)) - timedelta(days=days)
+
+
+def acquire_lease(owner: str = None) -> bool:
+    """Take or renew the pruning lease; False while another live worker holds it."""
+    owner = owner or _owner
+    now = datetime.now(timezone.utc)
+    try:
+        settings_collection.find_one_and_update(
+            {"_id": LEASE_ID, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=AUDIT_PRUNE_LEASE_SECONDS)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # the lease exists, is unexpired and belongs to someone else
+        return False
+
+
+def release_lease(owner: str = None):
+    settings_collection.delete_one({"_id": LEASE_ID, "owner": owner or _owner})
+
+
+def _archive_path(day):
+    return os.path.join(AUDIT_ARCHIVE_DIR, f"{day:%Y}", f"{day:%m}", f"{day:%Y-%m-%d}.ndjson.gz")
+
+
+def _serialize(entry: dict) -> str:
+    row = {k: v for k, v in entry.items() if k not in ("search_grams", "search_grams_partial")}
+    row["_id"] = str(row.get("_id"))
+    ts = parse_timestamp(row.get("timestamp"))
+    row["timestamp"] = ts.isoformat() if ts else row.get("timestamp")
+    return json.dumps(row, default=str)
+
+
+def archive_and_prune(now=None, lease=None):
+    """Archive then delete every entry older than the retention cutoff.
+
+    Entries are appended to their day file before being deleted, so a crash
+    in between can only duplicate an entry in the archive, never lose it.
+    Readers skip duplicate ids. `lease()` is called before each batch and
+    the run stops as soon as it returns False.
+    """
+    cutoff = retention_cutoff(now)
+    archived = 0
+
+    while True:
+        if lease is not None and not lease():
+            logger.warning("audit retention: lease lost, stopping after %d entries", archived)
+            break
+        batch = list(
+            audit_logs.find({"timestamp": {"$lt": cutoff}})
+            .sort([("timestamp", 1), ("_id", 1)])
+            .limit(PRUNE_BATCH_SIZE)
+        )
+        if not batch:
+            break
+
+        by_day = {}
+        for entry in batch:
+            day = parse_timestamp(entry["timestamp"]).date()
+            by_day.setdefault(day, []).append(entry)
+
+        for day, entries in by_day.items():
+            path = _archive_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # gzip members can be concatenated, so appending keeps the file valid
+            with gzip.open(path, "at", encoding="utf-8") as fh:
+                for entry in entries:
+                    fh.write(_serialize(entry) + "\n")
+
+        audit_logs.delete_many({"_id": {"$in": [e["_id"] for e in batch]}})
+        archived += len(batch)
+
+    if archived:
+        logger.info("audit retention: archived and pruned %d entries older than %s", archived, cutoff.isoformat())
+    return {"archived": archived, "cutoff": cutoff}
+
+
+def _matches(entry: dict, filters: dict, from_ts, to_ts) -> bool:
+    """Python mirror of the admin audit query filters for archived rows."""
+    for k in ("event", "actor", "patient_id", "role"):
+        if filters.get(k) and entry.get(k) != filters.get(k):
+            return False
+
+    ts = parse_timestamp(entry.get("timestamp"))
+    if (from_ts and (ts is None or ts < from_ts)) or (to_ts and (ts is None or ts > to_ts)):
+        return False
+
+    detail = entry.get("detail") if isinstance(entry.get("detail"), dict) else {}
+    status = filters.get("status")
+    if status:
+        wanted = {"failed", "error"} if status.strip().lower() == "error" else {status.strip().lower()}
+        if str(detail.get("status") or "").lower() not in wanted:
+            return False
+
+    q = (filters.get("q") or "").strip().lower()
+    if q:
+        values = (entry.get(f) if "." not in f else detail.get(f.split(".", 1)[1]) for f in SEARCH_FIELDS)
+        if not any(isinstance(v, str) and q in v.lower() for v in values):
+            return False
+
+    return True
+
+
+def iter_archived(filters: dict):
+    """Yield archived entries matching `filters`, newest day first.
+
+    Reads one day file at a time, so memory is bounded by a single day of
+    archived entries.
+    """
+    from_ts = parse_timestamp(filters.get("from_ts")) if filters.get("from_ts") else None
+    to_ts = parse_timestamp(filters.get("to_ts")) if filters.get("to_ts") else None
+
+    if not os.path.isdir(AUDIT_ARCHIVE_DIR):
+        return
+
+    paths = []
+    for root, _dirs, files in os.walk(AUDIT_ARCHIVE_DIR):
+        paths.extend(os.path.join(root, f) for f in files if f.endswith(".ndjson.gz"))
+
+    for path in sorted(paths, reverse=True):
+        day = os.path.basename(path)[:10]
+        if from_ts and day < from_ts.strftime("%Y-%m-%d"):
+            continue
+        if to_ts and day > to_ts.strftime("%Y-%m-%d"):
+            continue
+
+        seen = set()
+        rows = []
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                entry = json.loads(line)
+                if entry.get("_id") in seen:
+                    continue
+                seen.add(entry.get("_id"))
+                if _matches(entry, filters, from_ts, to_ts):
+                    rows.append(entry)
+
+        # day files are appended oldest first; exports are newest first
+        yield from reversed(rows)
+
+
+def _run():
+    while not _stop.is_set():
+        try:
+            if acquire_lease():
+                archive_and_prune(lease=acquire_lease)
+        except Exception:
+            logger.exception("Audit retention run failed")
+        _stop.wait(AUDIT_PRUNE_INTERVAL_SECONDS)
+
+
+def start_pruner():
+    """Start the background retention thread (idempotent)."""
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="audit-retention", daemon=True)
+    _thread.start()
+
+
+def stop_pruner():
+    _stop.set()
+    try:
+        release_lease()
+    except Exception:
+        logger.exception("Failed to release the audit retention lease")
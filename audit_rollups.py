@@ -0,0 +1,126 @@
+# app/utils/audit_rollups.py
+"""Hourly audit counters kept alongside the audit log.
+
+Each document in `audit_rollups` covers one UTC hour:
+
+    {"_id": <hour start>, "total": n,
+     "events": {EVENT: n}, "status": {"success"|"warning"|"failed": n},
+     "actions": {ACTION: n}}
+
+`record` is called by the audit writer for every entry, so stats endpoints
+read one small document per hour instead of scanning `audit_logs`. Run this
+module as a script to (re)build the counters from existing logs:
+
+    python -m app.utils.audit_rollups
+"""
+import logging
+from collections import defaultdict
+from datetime import timezone
+from app.db import audit_logs, audit_rollups
+
+logger = logging.getLogger(__name__)
+
+STATUS_BUCKETS = {
+    "success": "success",
+    "warning": "warning",
+    "failed": "failed",
+    "error": "failed",
+}
+
+
+def _key(name) -> str:
+    # Mongo field names cannot contain '.' or start with '$'
+    return str(name).replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+
+def _unkey(key: str) -> str:
+    return key.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+
+def _hour(ts):
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _counters(entry: dict):
+    """Field paths to increment for one audit entry."""
+    fields = ["total", f"events.{_key(entry.get('event'))}"]
+    detail = entry.get("detail") if isinstance(entry.get("detail"), dict) else {}
+    status = STATUS_BUCKETS.get(str(detail.get("status") or "").strip().lower())
+    if status:
+        fields.append(f"status.{status}")
+    if detail.get("action"):
+        fields.append(f"actions.{_key(detail.get('action'))}")
+    return fields
+
+
+def record(entry: dict):
+    """Increment the hourly counters for a freshly written audit entry."""
+    inc = {f: 1 for f in _counters(entry)}
+    audit_rollups.update_one({"_id": _hour(entry["timestamp"])}, {"$inc": inc}, upsert=True)
+
+
+def _sum_buckets(docs):
+    totals = {"total": 0, "events": defaultdict(int), "status": defaultdict(int), "actions": defaultdict(int)}
+    for doc in docs:
+        totals["total"] += doc.get("total", 0)
+        for group in ("events", "status", "actions"):
+            for k, v in (doc.get(group) or {}).items():
+                totals[group][_unkey(k)] += v
+    return {
+        "total": totals["total"],
+        "events": dict(totals["events"]),
+        "status": dict(totals["status"]),
+        "actions": dict(totals["actions"]),
+    }
+
+
+def read_totals(since=None):
+    """Sum the hourly buckets (optionally from `since`) into overall counters."""
+    query = {"_id": {"$gte": _hour(since)}} if since else {}
+    return _sum_buckets(audit_rollups.find(query))
+
+
+async def aread_totals(since=None):
+    """read_totals for async routes (Motor)."""
+    # imported here so scripts and the sync audit writer never create the Motor client
+    from app import db_async
+
+    query = {"_id": {"$gte": _hour(since)}} if since else {}
+    return _sum_buckets(await db_async.audit_rollups.find(query).to_list(None))
+
+
+def backfill():
+    """Rebuild every hourly bucket from `audit_logs`.
+
+    Buckets are replaced rather than incremented, so the job can be re-run.
+    Entries written to the current hour while it runs may be counted twice;
+    run it during a quiet period or simply re-run it afterwards.
+    """
+    buckets = defaultdict(lambda: defaultdict(int))
+    projection = {"_id": 0, "event": 1, "detail": 1, "timestamp": 1}
+    scanned = 0
+    for entry in audit_logs.find({"timestamp": {"$type": "date"}}, projection).batch_size(1000):
+        bucket = buckets[_hour(entry["timestamp"])]
+        for f in _counters(entry):
+            bucket[f] += 1
+        scanned += 1
+
+    for hour, counts in buckets.items():
+        doc = {"total": 0, "events": {}, "status": {}, "actions": {}}
+        for path, n in counts.items():
+            if path == "total":
+                doc["total"] = n
+            else:
+                group, name = path.split(".", 1)
+                doc[group][name] = n
+        audit_rollups.replace_one({"_id": hour}, doc, upsert=True)
+
+    logger.info("audit rollup backfill: %d entries into %d buckets", scanned, len(buckets))
+    return {"scanned": scanned, "buckets": len(buckets)}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print("✅ Rollup backfill finished:", backfill())
@@ -0,0 +1,115 @@
+# app/utils/audit_search.py
+"""Trigram search over audit log entries.
+
+The audit writer stores the lowercase trigrams of the searchable fields
+(event, actor, role, detail.action, detail.note) in a multikey
+`search_grams` array. A search for `q` first narrows candidates through the
+`search_grams` index (every trigram of `q` must be present) and only then
+applies a literal, case-insensitive substring check to those candidates, so
+results keep the old substring semantics without scanning the collection.
+
+Only the first MAX_FIELD_CHARS characters of a field are turned into
+grams. Entries with a longer field are flagged `search_grams_partial`;
+they are always kept as candidates, so a match past the cap is still found
+by the substring check.
+
+Run as a script to backfill grams for entries written before this existed
+(--rescan recomputes every entry, e.g. to flag partial ones written before
+the flag existed):
+
+    python -m app.utils.audit_search [--batch-size 500] [--rescan]
+"""
+import argparse
+import logging
+import re
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+GRAM_SIZE = 3
+# notes can hold free text (e.g. AI questions); cap how much of it is indexed
+MAX_FIELD_CHARS = 256
+
+SEARCH_FIELDS = ("event", "actor", "role", "detail.action", "detail.note")
+
+
+def _field_values(entry: dict):
+    detail = entry.get("detail") if isinstance(entry.get("detail"), dict) else {}
+    for value in (entry.get("event"), entry.get("actor"), entry.get("role"),
+                  detail.get("action"), detail.get("note")):
+        if isinstance(value, str) and value:
+            yield value.lower()
+
+
+def _grams(text: str):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def search_grams(entry: dict):
+    """Sorted trigram list for an audit entry (stored as `search_grams`)."""
+    grams = set()
+    for value in _field_values(entry):
+        grams |= _grams(value[:MAX_FIELD_CHARS])
+    return sorted(grams)
+
+
+def search_fields(entry: dict) -> dict:
+    """The search fields to store on an audit entry: grams, plus the partial flag if truncated."""
+    fields = {"search_grams": search_grams(entry)}
+    if any(len(value) > MAX_FIELD_CHARS for value in _field_values(entry)):
+        fields["search_grams_partial"] = True
+    return fields
+
+
+def search_query(q: str):
+    """Mongo query fragment matching entries whose searchable fields contain `q`."""
+    needle = q.strip().lower()
+    pattern = re.escape(needle)
+    substring = {"$or": [
+        {field: {"$regex": pattern, "$options": "i"}} for field in SEARCH_FIELDS
+    ]}
+    if len(needle) < GRAM_SIZE:
+        # too short to use the gram index; fall back to the substring scan
+        return substring
+    return {"$and": [
+        # truncated entries may match past the indexed prefix; let the substring check decide
+        {"$or": [{"search_grams": {"$all": sorted(_grams(needle))}}, {"search_grams_partial": True}]},
+        substring
+    ]}
+
+
+def backfill_search_grams(batch_size: int = 500, rescan: bool = False):
+    """Populate `search_grams` (and the partial flag) on audit entries that do not have it yet."""
+    from app.db import audit_logs
+
+    updated = 0
+    last_id = None
+    projection = {"event": 1, "actor": 1, "role": 1, "detail": 1}
+
+    while True:
+        query = {} if rescan else {"search_grams": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = list(audit_logs.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        ops = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": search_fields(doc)})
+            for doc in batch
+        ]
+        updated += audit_logs.bulk_write(ops, ordered=False).modified_count
+        last_id = batch[-1]["_id"]
+        logger.info("audit search backfill: %d entries indexed", updated)
+
+    return {"updated": updated}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backfill audit search grams")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--rescan", action="store_true", help="recompute entries that already have grams")
+    args = parser.parse_args()
+    print("✅ Backfill finished:", backfill_search_grams(args.batch_size, args.rescan))
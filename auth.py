@@ -5,8 +5,11 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from typing import Optional
-from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-from app.db import users_collection
+from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, USER_CACHE_TTL_SECONDS, BCRYPT_ROUNDS
+from app import db_async
+from app.utils.cache import TTLCache
+import hashlib
+import time
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
@@ -15,12 +18,21 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# repeat callers skip both JWT verification and the users lookup
+_claims_cache = TTLCache(maxsize=4096, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+_user_cache = TTLCache(maxsize=1024, ttl=USER_CACHE_TTL_SECONDS)
+
 def verify_password(plain, hashed):
     return pwd_context.verify(plain, hashed)
 
+def verify_and_update_password(plain, hashed):
+    """Verify and return (ok, new_hash); new_hash is set when the stored hash
+    uses outdated parameters (e.g. a lower bcrypt cost) and should be replaced."""
+    return pwd_context.verify_and_update(plain, hashed)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
@@ -30,26 +42,58 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        role = payload.get("role")
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return await user_from_token(token)
 
-        if not username:
-            raise HTTPException(status_code=401, detail="Invalid token")
 
+def _decode_claims(token: str) -> dict:
+    """Decode and verify a JWT, caching the claims by token hash until it expires."""
+    key = hashlib.sha256(token.encode()).hexdigest()
+    claims = _claims_cache.get(key)
+    if claims is not None:
+        # cached entries never outlive the token, but re-check expiry anyway
+        if claims.get("exp", 0) > time.time():
+            return claims
+        _claims_cache.pop(key)
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = users_collection.find_one({"username": username})
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
+    ttl = claims.get("exp", 0) - time.time()
+    if ttl > 0:
+        _claims_cache.set(key, claims, ttl=ttl)
+    return claims
+
+
+async def user_from_token(token: str):
+    """Resolve a bearer token to its user document (role taken from the token)."""
+    payload = _decode_claims(token)
+    username = payload.get("sub")
+    role = payload.get("role")
+
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = _user_cache.get(username)
+    if user is None:
+        user = await db_async.users_collection.find_one({"username": username}, {"password": 0})
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        _user_cache.set(username, user)
 
+    # copy so per-request changes never leak into the cache
+    user = dict(user)
     user["role"] = role
     return user
 
 
+def invalidate_user(username: str):
+    """Drop a cached user record; call whenever a user document changes."""
+    _user_cache.pop(username)
+
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
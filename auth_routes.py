@@ -1,53 +1,67 @@
-
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from datetime import timedelta
 from app.schemas import LoginRequest
-from app.db import users_collection
-from app.auth import verify_password, create_access_token
+from app import db_async
+from app.auth import verify_and_update_password, create_access_token, invalidate_user
 from app.utils.activity_logger import log_activity
+from app.utils import executors, login_guard
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
+
+async def _login_failed(data: LoginRequest, ip: str):
+    # count towards backoff and log; never let logging block the response
+    login_guard.record_failure(data.username, ip)
+    try:
+        await run_in_threadpool(log_activity, actor=data.username, role=(data.role or "unknown"), action="LOGIN_FAILED", status="Failed", ip=ip)
+    except Exception:
+        pass
+
+
 @router.post("/login")
-def login(data: LoginRequest):
-    user = users_collection.find_one({"username": data.username})
+async def login(data: LoginRequest, request: Request):
+    ip = login_guard.client_ip(request)
+
+    # ⛔ locked-out username+IP pairs / IPs are rejected before any bcrypt work
+    login_guard.check(data.username, ip)
+
+    user = await db_async.users_collection.find_one({"username": data.username})
 
     if not user:
         # log failed login (user not found)
-        try:
-            log_activity(actor=data.username, role=(data.role or "unknown"), action="LOGIN_FAILED", status="Failed")
-        except Exception:
-            pass
+        await _login_failed(data, ip)
         raise HTTPException(status_code=401, detail="User not found")
 
     # 🔐 role validation
     if user["role"].lower() != data.role.lower():
         # log failed login (role mismatch)
-        try:
-            log_activity(actor=data.username, role=data.role or "unknown", action="LOGIN_FAILED", status="Failed")
-        except Exception:
-            pass
+        await _login_failed(data, ip)
         raise HTTPException(status_code=403, detail="Role mismatch")
 
-    # 🔑 password validation (VERY IMPORTANT)
+    # 🔑 password validation (VERY IMPORTANT) on the bounded password pool
     try:
-        pw_ok = verify_password(data.password, user["password"])
+        pw_ok, new_hash = await executors.passwords.run(verify_and_update_password, data.password, user["password"])
+    except HTTPException:
+        # pool saturated -> 503 + Retry-After
+        raise
     except Exception:
         # treat verification errors as failed attempts and log
-        try:
-            log_activity(actor=data.username, role=data.role or "unknown", action="LOGIN_FAILED", status="Failed")
-        except Exception:
-            pass
+        await _login_failed(data, ip)
         raise HTTPException(status_code=401, detail="Invalid password")
 
     if not pw_ok:
         # log failed login (invalid password)
-        try:
-            log_activity(actor=data.username, role=data.role or "unknown", action="LOGIN_FAILED", status="Failed")
-        except Exception:
-            pass
+        await _login_failed(data, ip)
         raise HTTPException(status_code=401, detail="Invalid password")
 
+    login_guard.record_success(data.username, ip)
+
+    # ♻️ stored hash uses an outdated bcrypt cost -> replace it transparently
+    if new_hash:
+        await db_async.users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+        invalidate_user(user["username"])
+
     token = create_access_token(
         data={"sub": user["username"], "role": user["role"]},
         expires_delta=timedelta(minutes=60)
@@ -55,7 +69,7 @@ def login(data: LoginRequest):
 
     # log successful login
     try:
-        log_activity(actor=user["username"], role=user["role"], action="LOGIN_SUCCESS", status="Success")
+        await run_in_threadpool(log_activity, actor=user["username"], role=user["role"], action="LOGIN_SUCCESS", status="Success", ip=ip)
     except Exception:
         pass
 
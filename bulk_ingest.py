@@ -0,0 +1,298 @@
+# app/scripts/bulk_ingest.py
+"""Bulk ingestion of a clinic's notes: directory or .zip -> clean -> MongoDB -> embed queue.
+
+Replaces one upload + /clean-phi + /ai/embed round trip per note with a
+staged pipeline connected by bounded queues (a slow stage blocks the ones
+before it instead of buffering the whole archive in memory):
+
+    read     reader threads load and decode files, extract dashboard fields
+    redact   process pool runs redact_text over each batch
+    write    insert_many per batch, then the batch is checkpointed
+    enqueue  each written batch is submitted as an embed job
+
+Every `*.txt` file becomes one patient document. Its patient_id is the
+relative path without the extension, with `-` between the parts
+(`clinic_a/123.txt` -> `clinic_a-123`), so same-named files in different
+folders stay apart; top-level files keep their plain stem.
+Completed sources are appended to the checkpoint file, so an interrupted
+run can simply be restarted and skips what was already written. Docs/sec
+per stage is printed at the end.
+
+Embedding is handed to the API server: vectors live in the server's
+in-memory VectorStore, so each written batch is queued as an `embed` job
+(app.services.embed_jobs, same EMBED_JOBS_DB) and the server's workers
+move the patients from `queued` to `embedded`. With --no-embed the records
+stay `uploaded` and can be embedded later through /ai/jobs.
+
+    python -m app.scripts.bulk_ingest NOTES_DIR_OR_ZIP [--checkpoint FILE]
+        [--readers 4] [--workers 4] [--batch-size 64] [--no-embed]
+"""
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from app.db import patients_collection
+from app.routes.upload import extract_fields
+from app.services import embed_jobs
+from app.services.clinical_extractor import extract_clinical_fields
+from app.services.ingest import StreamDecoder
+from app.services.patient_text import seal_fields
+from app.services.phi_cleaner import redact_text
+from app.utils.audit_logger import log_audit
+from app.utils.executors import process_context
+
+logger = logging.getLogger(__name__)
+
+ACTOR = "bulk-ingest"
+ACTOR_USER = {"username": ACTOR, "role": "system"}
+# batches buffered between two stages (back-pressure bound)
+QUEUE_BATCHES = 4
+
+_DONE = object()
+
+
+class StageStats:
+    """Docs processed and time spent working (not waiting on queues) per stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.docs = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, docs: int, seconds: float):
+        with self._lock:
+            self.docs += docs
+            self.busy += seconds
+
+    def rate(self) -> float:
+        return self.docs / self.busy if self.busy else 0.0
+
+
+def iter_sources(path: Path):
+    """Yield (source_key, loader) for every .txt note under a directory or in a zip."""
+    if path.is_dir():
+        for p in sorted(path.rglob("*.txt")):
+            yield str(p.relative_to(path)), p.read_bytes
+        return
+
+    local = threading.local()
+
+    def _member(name):
+        def load():
+            # one handle per reader thread; ZipFile reads are not thread-safe
+            if not hasattr(local, "zf"):
+                local.zf = zipfile.ZipFile(path)
+            return local.zf.read(name)
+        return load
+
+    with zipfile.ZipFile(path) as zf:
+        names = sorted(n for n in zf.namelist() if n.lower().endswith(".txt"))
+    for name in names:
+        yield name, _member(name)
+
+
+def load_checkpoint(path: Path) -> set:
+    if not path.exists():
+        return set()
+    with path.open(encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def _append_checkpoint(path: Path, keys):
+    with path.open("a", encoding="utf-8") as f:
+        f.writelines(k + "\n" for k in keys)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _patient_id(key: str) -> str:
+    return "-".join(Path(key).with_suffix("").parts)
+
+
+def _read_note(key: str, load) -> dict:
+    decoder = StreamDecoder()
+    text = decoder.feed(load(), final=True)
+    fields = extract_fields(text)
+    value = lambda name: fields[name].group(1) if fields[name] else None
+    return {
+        "source": key,
+        "patient_id": _patient_id(key),
+        "patient_name": value("patient_name"),
+        "age": int(value("age")) if value("age") else None,
+        "gender": value("gender"),
+        "chief_complaint": value("chief_complaint"),
+        "raw_text": text,
+    }
+
+
+def run_pipeline(source: Path, checkpoint: Path, readers: int = 4, workers: int = 4,
+                 batch_size: int = 64, embed: bool = True) -> dict:
+    """Run the staged ingestion; returns counts and the per-stage stats."""
+    done = load_checkpoint(checkpoint)
+    stats = {name: StageStats(name) for name in ("read", "redact", "write", "enqueue")}
+    counts = {"written": 0, "skipped": 0, "failed": 0}
+    job_ids = []
+    if embed:
+        embed_jobs.init_db()
+    counts_lock = threading.Lock()
+
+    def fail(n, what):
+        logger.exception("bulk ingest: %s failed", what)
+        with counts_lock:
+            counts["failed"] += n
+
+    source_q = queue.Queue(maxsize=readers * 2)
+    read_q = queue.Queue(maxsize=batch_size * QUEUE_BATCHES)
+    write_q = queue.Queue(maxsize=QUEUE_BATCHES)
+
+    def feed():
+        for key, load in iter_sources(source):
+            if key in done:
+                with counts_lock:
+                    counts["skipped"] += 1
+                continue
+            source_q.put((key, load))
+        for _ in range(readers):
+            source_q.put(_DONE)
+
+    def read():
+        while (item := source_q.get()) is not _DONE:
+            start = time.perf_counter()
+            try:
+                record = _read_note(*item)
+            except Exception:
+                fail(1, f"reading {item[0]}")
+                continue
+            stats["read"].add(1, time.perf_counter() - start)
+            read_q.put(record)
+        read_q.put(_DONE)
+
+    def redact(pool):
+        finished = 0
+        batch = []
+        while finished < readers:
+            record = read_q.get()
+            if record is _DONE:
+                finished += 1
+            else:
+                batch.append(record)
+            if batch and (len(batch) >= batch_size or finished == readers):
+                start = time.perf_counter()
+                try:
+                    cleaned = list(pool.map(redact_text, [r["raw_text"] for r in batch],
+                                            chunksize=max(1, len(batch) // workers)))
+                except Exception:
+                    fail(len(batch), "redaction batch")
+                else:
+                    for r, text in zip(batch, cleaned):
+                        r["cleaned_text"] = text
+                        r["clinical"] = extract_clinical_fields(r)
+                    stats["redact"].add(len(batch), time.perf_counter() - start)
+                    write_q.put(batch)
+                batch = []
+        write_q.put(_DONE)
+
+    started = time.perf_counter()
+    # the pool forks lazily, once the feed/reader threads already hold locks
+    with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as pool:
+        threads = [threading.Thread(target=feed, name="ingest-feed", daemon=True)]
+        threads += [threading.Thread(target=read, name=f"ingest-read-{i}", daemon=True) for i in range(readers)]
+        threads.append(threading.Thread(target=redact, args=(pool,), name="ingest-redact", daemon=True))
+        for t in threads:
+            t.start()
+
+        # write stage runs on this thread
+        while (batch := write_q.get()) is not _DONE:
+            start = time.perf_counter()
+            keys = [r["source"] for r in batch]
+            # a crash between insert and checkpoint would otherwise duplicate the batch on resume
+            existing = {d["ingest_source"] for d in patients_collection.find(
+                {"ingest_source": {"$in": keys}}, {"_id": 0, "ingest_source": 1})}
+            now = datetime.utcnow()
+            docs = [
+                {
+                    "patient_id": r["patient_id"],
+                    "patient_name": r["patient_name"],
+                    "age": r["age"],
+                    "gender": r["gender"],
+                    "chief_complaint": r["chief_complaint"],
+                    "raw_text": r["raw_text"],
+                    "cleaned_text": r["cleaned_text"],
+                    "clinical": r["clinical"],
+                    "status": "uploaded",
+                    "ingest_source": r["source"],
+                    "uploaded_by": ACTOR,
+                    "created_at": now,
+                }
+                for r in batch if r["source"] not in existing
+            ]
+            seal_fields(*docs)
+            try:
+                if docs:
+                    patients_collection.insert_many(docs, ordered=False)
+            except Exception:
+                fail(len(batch), "write batch")
+                continue
+            _append_checkpoint(checkpoint, keys)
+            with counts_lock:
+                counts["written"] += len(docs)
+                counts["skipped"] += len(batch) - len(docs)
+            stats["write"].add(len(batch), time.perf_counter() - start)
+
+            if embed and docs:
+                # the server's job workers embed into the VectorStore that /ai/ask searches
+                start = time.perf_counter()
+                try:
+                    job = embed_jobs.submit("embed", [d["patient_id"] for d in docs], ACTOR_USER)
+                except Exception:
+                    logger.exception("bulk ingest: queueing embed job failed; records stay 'uploaded'")
+                else:
+                    job_ids.append(job["job_id"])
+                    stats["enqueue"].add(len(docs), time.perf_counter() - start)
+            logger.info("bulk ingest: %d written, %d failed", counts["written"], counts["failed"])
+
+        for t in threads:
+            t.join()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **counts,
+        "embed_jobs": job_ids,
+        "elapsed_seconds": round(elapsed, 2),
+        "docs_per_second": round(counts["written"] / elapsed, 2) if elapsed else 0.0,
+        "stages": {
+            name: {"docs": s.docs, "busy_seconds": round(s.busy, 2), "docs_per_second": round(s.rate(), 2)}
+            for name, s in stats.items()
+        },
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", type=Path, help="directory of .txt notes or a .zip archive")
+    parser.add_argument("--checkpoint", type=Path, default=None,
+                        help="resume file (default: <source>.ingest-checkpoint)")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--no-embed", action="store_true")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or args.source.with_name(args.source.name + ".ingest-checkpoint")
+    report = run_pipeline(args.source, checkpoint, readers=args.readers, workers=args.workers,
+                          batch_size=args.batch_size, embed=not args.no_embed)
+
+    log_audit(event="BULK_INGEST_COMPLETED", actor=ACTOR, role="system",
+              detail={"status": "completed", "note": f"{report['written']} written, {report['failed']} failed"})
+
+    for name, s in report["stages"].items():
+        print(f"  {name:<7} {s['docs']:>7} docs  {s['busy_seconds']:>8}s busy  {s['docs_per_second']:>9} docs/s")
+    print("✅ Bulk ingest finished:", {k: v for k, v in report.items() if k != "stages"})
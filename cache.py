@@ -0,0 +1,107 @@
+# app/utils/cache.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Used for hot read paths (counts, lookups) where slightly stale values are
+    acceptable. `maxsize` bounds memory; the least recently used entry is
+    evicted first.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_async = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory, ttl: float = None):
+        """Return the cached value or compute it with `factory()`.
+
+        Concurrent callers missing the same key wait for a single computation
+        (single-flight) instead of all hitting the backend at once.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        with key_lock:
+            try:
+                value = self.get(key, _MISSING)
+                if value is _MISSING:
+                    value = factory()
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is key_lock:
+                        del self._inflight[key]
+
+    async def aget_or_set(self, key, factory, ttl: float = None):
+        """Async get_or_set: `factory` is a coroutine function.
+
+        Concurrent awaiters of a missing key share one task. The task is
+        shielded, so a client that disconnects does not cancel the
+        computation the others are waiting on. Failures are not cached.
+        Call from a single event loop.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        task = self._inflight_async.get(key)
+        if task is None:
+            async def fill():
+                try:
+                    result = await factory()
+                    self.set(key, result, ttl)
+                    return result
+                finally:
+                    self._inflight_async.pop(key, None)
+
+            task = asyncio.ensure_future(fill())
+            self._inflight_async[key] = task
+        return await asyncio.shield(task)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[1] if item else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
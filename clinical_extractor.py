@@ -0,0 +1,119 @@
+# app/services/clinical_extractor.py
+"""Single extraction stage for the non-PHI clinical fields of a patient.
+
+Runs when a record is uploaded or its text changes (embed / re-embed) and
+the result is stored on the patient document under `clinical`, stamped with
+EXTRACTOR_VERSION. Readers project `clinical` instead of re-running these
+regexes; bump the version whenever the heuristics change so stale documents
+are re-extracted on next access.
+"""
+import re
+from datetime import datetime
+
+EXTRACTOR_VERSION = 2
+
+# document fields the heuristics read from
+TEXT_FIELDS = ("original_text", "raw_text", "cleaned_text", "chief_complaint", "notes")
+SOURCE_FIELDS = TEXT_FIELDS + ("age", "diagnosis", "past_history")
+
+HISTORY_KEYWORDS = ("hypertension", "diabetes", "asthma", "copd", "cancer", "stroke")
+
+BP_RE = re.compile(r"\b(?:BP|Blood Pressure)[: ]+\s*(\d{2,3}/\d{2,3})", re.IGNORECASE)
+PMH_RE = re.compile(r"Past Medical History:\s*(.+?)(?:\n|$)", re.IGNORECASE)
+HX_RE = re.compile(r"(?:History of|Hx[:\s]+)\s*([A-Za-z0-9\- ,/]+?)(?:[.,\n]|$)", re.IGNORECASE)
+YEAR_RE = re.compile(r"(19\d{2}|20\d{2})")
+DIAGNOSIS_RE = re.compile(r"Primary Diagnosis:\s*(.+)", re.IGNORECASE)
+MED_LINE_RE = re.compile(r"\b\d+\s*mg\b|\bDose\b|\bdose\b|once daily|twice daily|tablet", re.IGNORECASE)
+KEYWORD_RES = {kw: re.compile(rf"\b{kw}\b", re.IGNORECASE) for kw in HISTORY_KEYWORDS}
+
+
+def age_group(age):
+    try:
+        a = int(age)
+    except (TypeError, ValueError):
+        return None
+    if a < 18:
+        return "pediatric"
+    if a >= 65:
+        return "senior"
+    return "adult"
+
+
+def _joined(patient: dict, fields) -> str:
+    return " ".join(str(patient.get(k) or "") for k in fields)
+
+
+def _age(patient: dict):
+    if patient.get("age") is not None:
+        return patient.get("age")
+    # look for a 4-digit year in text like '1980' or '/04/1980' to estimate age
+    y = YEAR_RE.search(_joined(patient, ("original_text", "raw_text", "cleaned_text", "notes")))
+    if y:
+        return datetime.utcnow().year - int(y.group(1))
+    return None
+
+
+def _past_history(patient: dict, text: str):
+    m = PMH_RE.search(text)
+    if m:
+        return m.group(1).strip()
+    m = HX_RE.search(text)
+    if m:
+        return m.group(1).strip()
+    keywords = [kw for kw, rx in KEYWORD_RES.items() if rx.search(text)]
+    if keywords:
+        return ", ".join(keywords)
+    return patient.get("past_history") or patient.get("notes") or None
+
+
+def _medications(text: str):
+    return [
+        {"name": line.strip(), "dose": "", "frequency": ""}
+        for line in re.split(r"[\n\r]+", text)
+        if MED_LINE_RE.search(line)
+    ]
+
+
+def _risk_level(text: str):
+    t = text.lower()
+    if any(k in t for k in ("critical", "icu", "unstable", "hemodynamic")):
+        return "high"
+    if any(k in t for k in ("watch", "monitor", "concern")):
+        return "medium"
+    return "low"
+
+
+def extract_clinical_fields(patient: dict) -> dict:
+    """Compute the structured, non-PHI clinical fields for a patient document."""
+    text = _joined(patient, TEXT_FIELDS)
+    # diagnosis / medications / risk only look at the short clinical fields, never the full note
+    clinical_text = patient.get("notes") or patient.get("chief_complaint") or ""
+
+    bp = BP_RE.search(text)
+    if "diagnosis" in patient:
+        diagnosis = patient.get("diagnosis")
+    else:
+        m = DIAGNOSIS_RE.search(patient.get("chief_complaint") or "")
+        diagnosis = m.group(1).strip() if m else None
+
+    age = _age(patient)
+    return {
+        "age": age,
+        "age_group": age_group(age),
+        "bp": bp.group(1) if bp else None,
+        "past_history": _past_history(patient, text),
+        "primary_diagnosis": diagnosis,
+        "medications": _medications(clinical_text),
+        "risk_level": _risk_level(clinical_text),
+        "extractor_version": EXTRACTOR_VERSION,
+        "extracted_at": datetime.utcnow(),
+    }
+
+
+def is_current(clinical) -> bool:
+    return isinstance(clinical, dict) and clinical.get("extractor_version") == EXTRACTOR_VERSION
+
+
+def vector_metadata(clinical: dict) -> dict:
+    """Non-PHI subset stored alongside embeddings (only fields that were found)."""
+    return {k: clinical.get(k) for k in ("age", "bp", "past_history") if clinical.get(k) is not None}
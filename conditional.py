@@ -0,0 +1,35 @@
+# app/utils/conditional.py
+"""ETag helpers for conditional GETs on polled read endpoints.
+
+Routes compute a cheap version token (ids, vector ids, cache timestamps)
+before doing any enrichment work; when it matches the client's
+If-None-Match the route returns 304 and skips the rest.
+"""
+import hashlib
+import json
+from fastapi import Request, Response
+
+# clients may keep the body but must revalidate before reusing it
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """Weak ETag over any JSON-serializable version parts."""
+    raw = json.dumps(parts, default=str, sort_keys=True, separators=(",", ":"))
+    return 'W/"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(request: Request, etag: str):
+    """Return a 304 response if the request's If-None-Match matches `etag`."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    candidates = {c.strip() for c in header.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
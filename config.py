@@ -7,12 +7,63 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY") or "change-me"
 ALGORITHM = os.getenv("ALGORITHM") or "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES") or 60)
+# how long authenticated user records are reused before re-reading Mongo
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS") or 60)
 
 # AES_KEY as hex string in .env
 AES_KEY_HEX = os.getenv("AES_KEY") or "00000000000000000000000000000000"
+# key rotation: "1:<hex>,2:<hex>" (defaults to AES_KEY as id 1); new data uses the active id (0 = highest)
+AES_KEYS = os.getenv("AES_KEYS") or ""
+AES_ACTIVE_KEY_ID = int(os.getenv("AES_ACTIVE_KEY_ID") or 0)
+CIPHER_WORKERS = int(os.getenv("CIPHER_WORKERS") or 4)
 
 DB_URL = os.getenv("DATABASE_URL") or "sqlite:///./app.db"
 
+# MongoDB connection (shared by the sync pymongo and async Motor clients)
+MONGO_URL = os.getenv("MONGO_URL") or "mongodb://localhost:27017"
+MONGO_DB = os.getenv("MONGO_DB") or "medai"
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE") or 100)
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE") or 0)
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS") or 5000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS") or 5000)
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS") or 30000)
+
+# dedicated pools for CPU-heavy work (see app.utils.executors)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS") or 2)
+INFERENCE_QUEUE = int(os.getenv("INFERENCE_QUEUE") or 16)
+REDACTION_WORKERS = int(os.getenv("REDACTION_WORKERS") or os.cpu_count() or 2)
+REDACTION_QUEUE = int(os.getenv("REDACTION_QUEUE") or 64)
+EXECUTOR_RETRY_AFTER_SECONDS = int(os.getenv("EXECUTOR_RETRY_AFTER_SECONDS") or 3)
+
+# password hashing: changing the cost rehashes stored passwords on next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS") or 12)
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS") or 2)
+PASSWORD_QUEUE = int(os.getenv("PASSWORD_QUEUE") or 32)
+
+# login brute-force backoff (see app.utils.login_guard); the per-user limit counts per (username, IP)
+LOGIN_FREE_FAILURES_PER_USER = int(os.getenv("LOGIN_FREE_FAILURES_PER_USER") or 3)
+LOGIN_FREE_FAILURES_PER_IP = int(os.getenv("LOGIN_FREE_FAILURES_PER_IP") or 20)
+LOGIN_BACKOFF_BASE_SECONDS = float(os.getenv("LOGIN_BACKOFF_BASE_SECONDS") or 1)
+LOGIN_BACKOFF_MAX_SECONDS = float(os.getenv("LOGIN_BACKOFF_MAX_SECONDS") or 300)
+# comma-separated proxy IPs / CIDRs whose X-Forwarded-For is trusted for the client IP
+TRUSTED_PROXIES = os.getenv("TRUSTED_PROXIES") or ""
+
 CYBORGDB_URL = os.getenv("CYBORGDB_URL") or "http://localhost:7000"
 CYBORGDB_API_KEY = os.getenv("CYBORGDB_API_KEY") or ""
 DEMO_MODE = os.getenv("DEMO_MODE", "true").lower() in ("1", "true", "yes")
+
+# /ai/ask answers, keyed by patient vector version (see app.routes.ai_chatbot)
+ASK_CACHE_TTL_SECONDS = int(os.getenv("ASK_CACHE_TTL_SECONDS") or 300)
+ASK_CACHE_MAX_ENTRIES = int(os.getenv("ASK_CACHE_MAX_ENTRIES") or 512)
+
+# background embedding jobs (see app.services.embed_jobs)
+EMBED_JOBS_DB = os.getenv("EMBED_JOBS_DB") or "./embed_jobs.db"
+EMBED_JOB_WORKERS = int(os.getenv("EMBED_JOB_WORKERS") or 1)
+EMBED_JOB_BATCH_SIZE = int(os.getenv("EMBED_JOB_BATCH_SIZE") or 32)
+EMBED_JOB_POLL_SECONDS = float(os.getenv("EMBED_JOB_POLL_SECONDS") or 2)
+
+# audit retention: expired entries are archived here before being pruned
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR") or "./audit_archive"
+AUDIT_PRUNE_INTERVAL_SECONDS = int(os.getenv("AUDIT_PRUNE_INTERVAL_SECONDS") or 3600)
+# only the worker holding this Mongo lease prunes; renewed every batch
+AUDIT_PRUNE_LEASE_SECONDS = int(os.getenv("AUDIT_PRUNE_LEASE_SECONDS") or 300)
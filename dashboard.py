@@ -1,20 +1,27 @@
-from fastapi import APIRouter, Depends
-from datetime import datetime, timedelta
-from app.auth import get_current_user
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
+from app.auth import get_current_user, user_from_token
+import asyncio
+import json
 
 from fastapi import APIRouter, Depends, HTTPException
-from app.db import patients_collection
 from app.auth import require_role
 
 router = APIRouter(prefix="/patients", tags=["Patients"])
 
-from app.db import (
-    patients_collection,
-    users_collection,
-    audit_logs
-)
+from app import db_async
 from app.ai.vector_store import vector_store
 from app.auth import require_role
+from app.utils import audit_rollups, event_bus
+from app.utils.cache import TTLCache
+from app.utils.conditional import make_etag, not_modified, set_etag
+from app.db_indexes import PATIENT_SUMMARY_PROJECTION, PATIENT_VERSION_PROJECTION
+from app.services.ingest import load_stored_text
+from app.services.patient_text import open_fields
+from app.utils.pagination import decode_cursor, encode_cursor, seek_after
+from bson import ObjectId
+from bson.errors import InvalidId
 
 router = APIRouter(
     prefix="/dashboard",
@@ -24,48 +31,63 @@ router = APIRouter(
 # -------------------------------
 # 📊 ADMIN STATS
 # -------------------------------
-@router.get("/stats")
-def dashboard_stats(user=Depends(get_current_user)):
-
-    total_users = users_collection.count_documents({})
-    doctors = users_collection.count_documents({"role": "doctor"})
-    nurses = users_collection.count_documents({"role": "nurse"})
-    admins = users_collection.count_documents({"role": "admin"})
+# every dashboard polls this; share one computation across all callers
+STATS_TTL_SECONDS = 5
+_stats_cache = TTLCache(maxsize=1, ttl=STATS_TTL_SECONDS)
 
-    total_vectors = len(vector_store.vectors)
-    cleaned_records = patients_collection.count_documents({"status": "embedded"})
-    pending_phi = patients_collection.count_documents({"status": "uploaded"})
 
+async def _count_by(collection, field, match=None):
+    """One aggregation returning {value: count} for `field` (optionally pre-filtered)."""
+    pipeline = [{"$match": match}] if match else []
+    pipeline.append({"$group": {"_id": f"${field}", "count": {"$sum": 1}}})
+    return {d["_id"]: d["count"] for d in await collection.aggregate(pipeline).to_list(None)}
 
-    failed_logins = audit_logs.count_documents({
-        "detail.action": "LOGIN_FAILED"
-    })
 
-    total_events = audit_logs.count_documents({})
+async def _compute_stats():
+    roles, statuses, audit_totals = await asyncio.gather(
+        _count_by(db_async.users_collection, "role"),
+        _count_by(db_async.patients_collection, "status", {"status": {"$in": ["embedded", "uploaded"]}}),
+        # audit counters come from the hourly rollups, not a log scan
+        audit_rollups.aread_totals(),
+    )
 
     return {
-        "total_users": total_users,
-        "doctors": doctors,
-        "nurses": nurses,
-        "admins": admins,
-        "cleaned_records": cleaned_records,
-        "encrypted_vectors": total_vectors,
-        "pending_phi": pending_phi,
-        "failed_logins": failed_logins,
-        "total_events": total_events
+        "total_users": sum(roles.values()),
+        "doctors": roles.get("doctor", 0),
+        "nurses": roles.get("nurse", 0),
+        "admins": roles.get("admin", 0),
+        "cleaned_records": statuses.get("embedded", 0),
+        "encrypted_vectors": len(vector_store.vectors),
+        "pending_phi": statuses.get("uploaded", 0),
+        "failed_logins": audit_totals["actions"].get("LOGIN_FAILED", 0),
+        "total_events": audit_totals["total"],
+        # lets the UI show how old the numbers are
+        "as_of": datetime.now(timezone.utc).isoformat()
     }
 
 
+@router.get("/stats")
+async def dashboard_stats(request: Request, response: Response, user=Depends(get_current_user)):
+    stats = await _stats_cache.aget_or_set("stats", _compute_stats)
+    # the cached snapshot's timestamp is its version
+    etag = make_etag(stats["as_of"])
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_etag(response, etag)
+    return stats
+
+
 # -------------------------------
 # 🧾 RECENT ACTIVITY
 @router.get("/activity")
-def recent_activity(user=Depends(get_current_user)):
+async def recent_activity(user=Depends(get_current_user)):
 
 
-    logs = audit_logs.find(
+    logs = await db_async.audit_logs.find(
         {},
-        {"_id": 0}
-    ).sort("timestamp", -1).limit(8)
+        {"_id": 0, "search_grams": 0, "search_grams_partial": 0}
+    ).sort("timestamp", -1).limit(8).to_list(8)
 
     def extract_action(log):
         # action may be nested in detail.action (new schema) or top-level 'action' (legacy)
@@ -98,15 +120,57 @@ def recent_activity(user=Depends(get_current_user)):
         for log in logs
     ]
 
+# -------------------------------
+# 📡 LIVE EVENTS (SSE)
+# -------------------------------
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/events")
+async def dashboard_events(request: Request, token: str = Query(...)):
+    """Server-sent events replacing dashboard polling.
+
+    Emits `audit` events (same shape as /dashboard/activity rows) to every
+    signed-in user and `patient_embedded` events to doctors and nurses.
+    EventSource cannot send headers, so the bearer token is passed as the
+    `token` query parameter.
+    """
+    user = await user_from_token(token)
+    topics = {"audit"}
+    if user["role"] in ("doctor", "nurse"):
+        topics.add("patient_embedded")
+
+    sub = event_bus.subscribe(topics)
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await sub.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['topic']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+        finally:
+            sub.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ---------------------------------
 # 🔍 GET LATEST PATIENT (AUTO UPDATE)
 # ---------------------------------
 @router.get("/latest")
-def get_latest_patient(user=Depends(require_role("doctor"))):
-    patient = patients_collection.find_one(
+async def get_latest_patient(user=Depends(require_role("doctor"))):
+    patient = await db_async.patients_collection.find_one(
         {},
         sort=[("created_at", -1)],
-        projection={"_id": 0}
+        projection=PATIENT_SUMMARY_PROJECTION
     )
 
     if not patient:
@@ -119,10 +183,20 @@ def get_latest_patient(user=Depends(require_role("doctor"))):
 # 🔍 GET PATIENT BY ID
 # ---------------------------------
 @router.get("/{patient_id}")
-def get_patient(patient_id: str, user=Depends(require_role("doctor"))):
-    patient = patients_collection.find_one(
+async def get_patient(patient_id: str, request: Request, response: Response, user=Depends(require_role("doctor"))):
+    version = await db_async.patients_collection.find_one({"patient_id": patient_id}, PATIENT_VERSION_PROJECTION)
+    if not version:
+        raise HTTPException(status_code=404, detail="Patient not found")
+
+    etag = make_etag(version)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_etag(response, etag)
+
+    patient = await db_async.patients_collection.find_one(
         {"patient_id": patient_id},
-        {"_id": 0}
+        PATIENT_SUMMARY_PROJECTION
     )
 
     if not patient:
@@ -134,11 +208,91 @@ def get_patient(patient_id: str, user=Depends(require_role("doctor"))):
 # ---------------------------------
 # 🕒 PATIENT TIMELINE
 # ---------------------------------
+HISTORY_SUMMARY_FIELDS = ("patient_id", "status", "created_at", "vector_id", "uploaded_by", "clinical")
+# selectable via ?fields=; the large text fields are only served per version
+HISTORY_ALLOWED_FIELDS = HISTORY_SUMMARY_FIELDS + ("age", "gender", "chief_complaint", "patient_name")
+HISTORY_MAX_LIMIT = 100
+
+
 @router.get("/{patient_id}/history")
-def patient_history(patient_id: str, user=Depends(require_role("doctor"))):
-    records = patients_collection.find(
-        {"patient_id": patient_id},
-        {"_id": 0}
-    ).sort("created_at", 1)
+async def patient_history(
+    patient_id: str,
+    request: Request,
+    response: Response,
+    limit: int = 20,
+    cursor: str = None,
+    fields: str = None,
+    user=Depends(require_role("doctor"))
+):
+    """Paginated timeline of a patient's record versions, oldest first.
+
+    Each item is a lightweight summary (see HISTORY_SUMMARY_FIELDS) plus a
+    `version_id`; `fields` picks a comma-separated subset of
+    HISTORY_ALLOWED_FIELDS instead. Full text for one version is available
+    from /dashboard/{patient_id}/history/{version_id}. Pass `next_cursor`
+    back as `cursor` for the next page.
+    """
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        invalid = [f for f in selected if f not in HISTORY_ALLOWED_FIELDS]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Unsupported fields: {', '.join(invalid)}")
+    else:
+        selected = list(HISTORY_SUMMARY_FIELDS)
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+
+    versions = await db_async.patients_collection.find(
+        {"patient_id": patient_id}, PATIENT_VERSION_PROJECTION
+    ).to_list(None)
+    etag = make_etag(versions, limit, cursor, selected)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_etag(response, etag)
+
+    query = {"patient_id": patient_id}
+    if cursor:
+        ts, oid = decode_cursor(cursor)
+        query = {"$and": [query, seek_after("created_at", ts, oid, descending=False)]}
+
+    rows = await db_async.patients_collection.find(query, {f: 1 for f in selected + ["created_at"]}) \
+        .sort([("created_at", 1), ("_id", 1)]) \
+        .limit(limit + 1) \
+        .to_list(limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for r in rows:
+        item = {f: r.get(f) for f in selected}
+        item["version_id"] = str(r["_id"])
+        items.append(item)
+
+    return {
+        "patient_id": patient_id,
+        "versions": items,
+        "next_cursor": encode_cursor(rows[-1].get("created_at"), rows[-1]["_id"]) if has_more and rows else None
+    }
+
+
+@router.get("/{patient_id}/history/{version_id}")
+async def patient_history_version(patient_id: str, version_id: str, user=Depends(require_role("doctor"))):
+    """One full record version, including its text fields.
+
+    A body spilled to GridFS at upload is read back and returned as `stored_text`.
+    """
+    try:
+        oid = ObjectId(version_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Version not found")
+
+    record = await db_async.patients_collection.find_one({"_id": oid, "patient_id": patient_id})
+    if not record:
+        raise HTTPException(status_code=404, detail="Version not found")
 
-    return list(records)
\ No newline at end of file
+    open_fields(record)
+    file_id = record.pop("text_file_id", None)
+    if file_id is not None:
+        record["stored_text"] = await load_stored_text(file_id, record.get("text_encoding") or "utf-8")
+    record["version_id"] = str(record.pop("_id"))
+    return record
@@ -1,11 +1,30 @@
 from pymongo import MongoClient
+from app.config import (
+    MONGO_URL,
+    MONGO_DB,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+)
 
-client = MongoClient("mongodb://localhost:27017")
+# async routes use app.db_async (same settings); this client serves sync code paths
+client = MongoClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+)
 
-db = client["medai"]   # 👈 VERY IMPORTANT
+db = client[MONGO_DB]   # 👈 VERY IMPORTANT
 users_collection = db["users"]
 patients_collection = db["patients"]
 audit_logs = db["audit_logs"]
 activities_collection = db["activities"]
+# hourly audit counters maintained by the audit writer
+audit_rollups = db["audit_rollups"]
 # persistent system settings document
 settings_collection = db["settings"]
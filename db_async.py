@@ -0,0 +1,33 @@
+# app/db_async.py
+"""Async (Motor) handles for the collections used by async routes.
+
+Mirrors app.db so routes can await Mongo I/O on the event loop instead of
+holding a threadpool slot for every query. Both clients share the pool and
+timeout settings from app.config.
+"""
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.config import (
+    MONGO_URL,
+    MONGO_DB,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+)
+
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+)
+
+db = client[MONGO_DB]
+users_collection = db["users"]
+patients_collection = db["patients"]
+audit_logs = db["audit_logs"]
+audit_rollups = db["audit_rollups"]
+settings_collection = db["settings"]
@@ -0,0 +1,90 @@
+# app/db_indexes.py
+"""Declared MongoDB indexes for every collection, verified at startup.
+
+Bump INDEX_VERSION whenever INDEXES changes. On startup `ensure_indexes`
+creates anything missing (create_index is a no-op for existing indexes),
+drops the superseded ones listed in RETIRED_INDEXES, checks that every declared index is present and records the applied
+version in the settings collection so operators can see what is deployed.
+"""
+import logging
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from app.db import db, settings_collection
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 4
+
+INDEXES = {
+    "audit_logs": [
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        # filtered lists sort by (timestamp, _id); the _id suffix avoids an in-memory sort
+        IndexModel([("event", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("actor", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("patient_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        # multikey trigram index for /admin/audit?q= search
+        IndexModel([("search_grams", ASCENDING)]),
+        # entries whose long fields were only partly gram-indexed
+        IndexModel([("search_grams_partial", ASCENDING)], sparse=True),
+    ],
+    "patients": [
+        # latest embedded / uploaded lists; covers the ETag version probe
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("vector_id", ASCENDING)]),
+        # by-id reads and the history timeline; covers the version probe
+        IndexModel([("patient_id", ASCENDING), ("created_at", ASCENDING), ("status", ASCENDING), ("vector_id", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        # bulk ingest resume / duplicate check (only bulk-ingested records carry it)
+        IndexModel([("ingest_source", ASCENDING)], unique=True, sparse=True),
+    ],
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("role", ASCENDING)]),
+    ],
+}
+
+# replaced by the declared indexes above; dropped at startup if still present
+RETIRED_INDEXES = {
+    "audit_logs": ["event_1_timestamp_-1", "actor_1_timestamp_-1", "patient_id_1_timestamp_-1"],
+}
+
+# projections whose fields are all in the indexes above (index-only version probes)
+PATIENT_VERSION_PROJECTION = {"_id": 0, "created_at": 1, "status": 1, "vector_id": 1}
+
+# read routes never need the large PHI text fields (nor the GridFS pointer of a spilled body)
+PATIENT_TEXT_FIELDS = ("raw_text", "original_text", "cleaned_text")
+PATIENT_SUMMARY_PROJECTION = {"_id": 0, "text_file_id": 0, **{f: 0 for f in PATIENT_TEXT_FIELDS}}
+
+
+def ensure_indexes():
+    """Create and verify the declared indexes. Returns the missing index names."""
+    missing = []
+    for name, models in INDEXES.items():
+        collection = db[name]
+        for model in models:
+            try:
+                collection.create_indexes([model])
+            except PyMongoError:
+                logger.exception("Failed to create index %s.%s", name, model.document["name"])
+
+        existing = set(collection.index_information())
+        for retired in RETIRED_INDEXES.get(name, ()):
+            if retired in existing:
+                try:
+                    collection.drop_index(retired)
+                except PyMongoError:
+                    logger.exception("Failed to drop retired index %s.%s", name, retired)
+        missing.extend(
+            f"{name}.{m.document['name']}" for m in models if m.document["name"] not in existing
+        )
+
+    if missing:
+        logger.warning("Index verification failed (version %d); missing: %s", INDEX_VERSION, ", ".join(missing))
+    else:
+        settings_collection.update_one(
+            {"_id": "indexes"},
+            {"$set": {"version": INDEX_VERSION, "verified_at": datetime.utcnow()}},
+            upsert=True
+        )
+        logger.info("Indexes verified (version %d)", INDEX_VERSION)
+    return missing
@@ -0,0 +1,366 @@
+# app/services/embed_jobs.py
+"""Persistent background queue for bulk embed / re-embed jobs.
+
+Jobs live in a local SQLite file (EMBED_JOBS_DB) so a restart does not
+lose them: one row per job plus one row per patient. Worker threads claim
+queued patients in batches (BEGIN IMMEDIATE makes the claim atomic across
+threads and processes), embed the whole batch with one
+VectorStore.store_many call and write the results back with a single
+bulk_write. The patient document's `status` follows the item:
+
+    queued -> embedding -> embedded   (or embed_failed)
+
+`refresh` jobs only re-encode records whose input fingerprint (source
+text, extractor version, model version) changed or whose vector is gone;
+the rest are counted as `skipped`. They leave the patient's status alone
+unless a new vector is written, so already-embedded patients stay visible
+while a refresh runs and keep their status if it fails.
+
+Records without cleaned_text are redacted here, and the redacted text is
+stored (sealed) with the vector so /ai/analysis can use it.
+
+Workers run inside the API process because the vector store is held in
+memory there. Items left in `embedding` by a crashed worker are re-queued
+when the workers start.
+"""
+import logging
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.config import (
+    EMBED_JOBS_DB,
+    EMBED_JOB_WORKERS,
+    EMBED_JOB_BATCH_SIZE,
+    EMBED_JOB_POLL_SECONDS,
+)
+from app.db import patients_collection
+from app.services.clinical_extractor import (
+    SOURCE_FIELDS,
+    extract_clinical_fields,
+    is_current,
+    vector_metadata
+)
+from app.services.ingest import read_stored_text
+from app.services.patient_text import open_fields, seal_fields
+from app.services.phi_cleaner import redact_text
+from app.utils import event_bus
+
+logger = logging.getLogger(__name__)
+
+JOB_KINDS = {"embed": "VECTOR_EMBEDDED", "reembed": "VECTOR_REEMBEDDED", "refresh": "VECTOR_REEMBEDDED"}
+ITEM_STATES = ("queued", "embedding", "embedded", "skipped", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    submitted_by TEXT NOT NULL,
+    role TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    vector_id TEXT,
+    error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (job_id, patient_id)
+);
+CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status);
+"""
+
+_stop = threading.Event()
+_threads = []
+
+
+@contextmanager
+def _connect():
+    # autocommit; multi-statement writes use explicit BEGIN IMMEDIATE ... COMMIT
+    conn = sqlite3.connect(EMBED_JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_db():
+    with _connect() as conn:
+        conn.executescript(_SCHEMA)
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def _latest_docs(patient_ids):
+    """patient_id -> _id of the latest patient document."""
+    return {
+        row["_id"]: row["doc"]
+        for row in patients_collection.aggregate([
+            {"$match": {"patient_id": {"$in": list(patient_ids)}}},
+            {"$sort": {"created_at": -1}},
+            {"$project": {"patient_id": 1, "created_at": 1}},
+            {"$group": {"_id": "$patient_id", "doc": {"$first": "$$ROOT"}}},
+        ])
+    }
+
+
+def submit(kind: str, patient_ids, user: dict) -> dict:
+    """Queue one job over the latest record of each patient_id; returns its progress."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"kind must be one of {sorted(JOB_KINDS)}")
+
+    docs = _latest_docs(set(patient_ids))
+    if not docs:
+        raise LookupError("no matching patients")
+
+    job_id = f"JOB-{uuid.uuid4().hex[:12]}"
+    now = _now()
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO jobs (id, kind, submitted_by, role, total, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, kind, user["username"], user["role"], len(docs), now)
+        )
+        conn.executemany(
+            "INSERT INTO job_items (job_id, patient_id, doc_id, status, updated_at) VALUES (?, ?, ?, 'queued', ?)",
+            [(job_id, pid, str(doc["_id"]), now) for pid, doc in docs.items()]
+        )
+        conn.execute("COMMIT")
+
+    if kind != "refresh":
+        patients_collection.update_many(
+            {"_id": {"$in": [doc["_id"] for doc in docs.values()]}},
+            {"$set": {"status": "queued"}}
+        )
+    logger.info("queued %s job %s for %d patients", kind, job_id, len(docs))
+    return get_job(job_id)
+
+
+def _progress(conn, job) -> dict:
+    counts = dict.fromkeys(ITEM_STATES, 0)
+    for row in conn.execute(
+        "SELECT status, COUNT(*) AS n FROM job_items WHERE job_id = ? GROUP BY status", (job["id"],)
+    ):
+        counts[row["status"]] = row["n"]
+
+    if counts["queued"] == job["total"]:
+        status = "queued"
+    elif counts["queued"] or counts["embedding"]:
+        status = "running"
+    else:
+        status = "completed_with_errors" if counts["failed"] else "completed"
+
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "submitted_by": job["submitted_by"],
+        "created_at": job["created_at"],
+        "status": status,
+        "total": job["total"],
+        **counts,
+    }
+
+
+def get_job(job_id: str, include_failures: bool = False):
+    with _connect() as conn:
+        job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        progress = _progress(conn, job)
+        if include_failures:
+            progress["failures"] = [
+                {"patient_id": r["patient_id"], "error": r["error"]}
+                for r in conn.execute(
+                    "SELECT patient_id, error FROM job_items WHERE job_id = ? AND status = 'failed' LIMIT 100",
+                    (job_id,)
+                )
+            ]
+        return progress
+
+
+def list_jobs(limit: int = 20, submitted_by: str = None):
+    query = "SELECT * FROM jobs"
+    params = []
+    if submitted_by:
+        query += " WHERE submitted_by = ?"
+        params.append(submitted_by)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    with _connect() as conn:
+        return [_progress(conn, job) for job in conn.execute(query, params).fetchall()]
+
+
+def _claim(limit: int):
+    """Atomically move up to `limit` queued items to `embedding`."""
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT i.rowid AS rowid, i.*, j.kind, j.submitted_by, j.role FROM job_items i "
+            "JOIN jobs j ON j.id = i.job_id WHERE i.status = 'queued' ORDER BY i.rowid LIMIT ?",
+            (limit,)
+        ).fetchall()
+        if rows:
+            conn.executemany(
+                "UPDATE job_items SET status = 'embedding', updated_at = ? WHERE rowid = ?",
+                [(_now(), r["rowid"]) for r in rows]
+            )
+        conn.execute("COMMIT")
+    return [dict(r) for r in rows]
+
+
+def _finish(results):
+    """results: [(item, status, vector_id, error)]"""
+    now = _now()
+    with _connect() as conn:
+        conn.executemany(
+            "UPDATE job_items SET status = ?, vector_id = ?, error = ?, updated_at = ? "
+            "WHERE job_id = ? AND patient_id = ?",
+            [(status, vector_id, error, now, item["job_id"], item["patient_id"])
+             for item, status, vector_id, error in results]
+        )
+
+
+def _source_text(doc: dict) -> str:
+    """De-identified text to embed: cleaned_text, else the redacted original."""
+    if doc.get("cleaned_text"):
+        return doc["cleaned_text"]
+    raw = doc.get("raw_text") or doc.get("original_text")
+    if not raw and doc.get("text_file_id"):
+        raw = read_stored_text(doc["text_file_id"], doc.get("text_encoding") or "utf-8")
+    return redact_text(raw) if raw else ""
+
+
+def _set_patient_status(results):
+    """Mirror failed / skipped items onto the patient documents (refresh items keep theirs)."""
+    for state, patient_status in (("failed", "embed_failed"), ("skipped", "embedded")):
+        oids = [ObjectId(item["doc_id"]) for item, status, _, _ in results
+                if status == state and item["kind"] != "refresh"]
+        if oids:
+            patients_collection.update_many({"_id": {"$in": oids}}, {"$set": {"status": patient_status}})
+
+
+def process_batch(items) -> int:
+    """Embed one claimed batch; returns the number of items embedded.
+
+    Every item ends up finished in the queue, even if a write fails midway.
+    """
+    results = []
+    try:
+        return _embed_batch(items, results)
+    except Exception as e:
+        finished = {(item["job_id"], item["patient_id"]) for item, _, _, _ in results}
+        results.extend((item, "failed", None, str(e)) for item in items
+                       if (item["job_id"], item["patient_id"]) not in finished)
+        raise
+    finally:
+        try:
+            _set_patient_status(results)
+        finally:
+            _finish(results)
+
+
+def _embed_batch(items, results) -> int:
+    from app.ai.vector_store import fingerprint, vector_store
+    from app.utils.audit_logger import log_audit
+
+    oids = [ObjectId(item["doc_id"]) for item in items if item["kind"] != "refresh"]
+    if oids:
+        patients_collection.update_many({"_id": {"$in": oids}}, {"$set": {"status": "embedding"}})
+    oids = [ObjectId(item["doc_id"]) for item in items]
+    projection = {f: 1 for f in SOURCE_FIELDS + (
+        "clinical", "text_file_id", "text_encoding", "vector_id", "vector_fingerprint")}
+    docs = {str(d["_id"]): d for d in patients_collection.find({"_id": {"$in": oids}}, projection)}
+    open_fields(*docs.values())
+
+    work = []
+    for item in items:
+        doc = docs.get(item["doc_id"])
+        try:
+            if doc is None:
+                raise LookupError("patient record no longer exists")
+            text = _source_text(doc)
+            if not text.strip():
+                raise ValueError("no text to embed")
+        except Exception as e:
+            results.append((item, "failed", None, str(e)))
+            continue
+        fp = fingerprint(text)
+        if item["kind"] == "refresh" and doc.get("vector_fingerprint") == fp \
+                and vector_store.is_fresh(doc.get("vector_id"), fp):
+            results.append((item, "skipped", doc["vector_id"], None))
+            continue
+        clinical = doc.get("clinical") if is_current(doc.get("clinical")) else extract_clinical_fields(doc)
+        metadata = {"uploaded_by": item["submitted_by"], "role": item["role"], **vector_metadata(clinical)}
+        update = {"status": "embedded", "clinical": clinical, "vector_fingerprint": fp}
+        if not doc.get("cleaned_text"):
+            update["cleaned_text"] = text
+        work.append((item, update, (item["patient_id"], text, metadata)))
+
+    embedded = 0
+    if work:
+        try:
+            vector_ids = vector_store.store_many([w[2] for w in work], batch_size=EMBED_JOB_BATCH_SIZE)
+        except Exception as e:
+            logger.exception("embedding batch failed")
+            results.extend((item, "failed", None, str(e)) for item, _, _ in work)
+        else:
+            updates = [{**update, "vector_id": vector_id} for (_, update, _), vector_id in zip(work, vector_ids)]
+            seal_fields(*updates, ids=[ObjectId(item["doc_id"]) for item, _, _ in work])
+            patients_collection.bulk_write([
+                UpdateOne({"_id": ObjectId(item["doc_id"])}, {"$set": update})
+                for (item, _, _), update in zip(work, updates)
+            ], ordered=False)
+            results.extend((item, "embedded", vector_id, None) for (item, _, _), vector_id in zip(work, vector_ids))
+            for (item, _, _), vector_id in zip(work, vector_ids):
+                log_audit(event=JOB_KINDS[item["kind"]], actor=item["submitted_by"], role=item["role"],
+                          patient_id=item["patient_id"], detail={"vector_id": vector_id})
+                event_bus.publish("patient_embedded", {"patient_id": item["patient_id"], "vector_id": vector_id})
+                embedded += 1
+
+    return embedded
+
+
+def _run():
+    while not _stop.is_set():
+        try:
+            items = _claim(EMBED_JOB_BATCH_SIZE)
+            if items:
+                process_batch(items)
+                continue
+        except Exception:
+            logger.exception("embedding job worker failed")
+        _stop.wait(EMBED_JOB_POLL_SECONDS)
+
+
+def start_workers():
+    """Create the queue, re-queue interrupted items and start the workers (idempotent)."""
+    if any(t.is_alive() for t in _threads):
+        return
+    init_db()
+    with _connect() as conn:
+        requeued = conn.execute(
+            "UPDATE job_items SET status = 'queued', updated_at = ? WHERE status = 'embedding'", (_now(),)
+        ).rowcount
+    if requeued:
+        logger.info("re-queued %d interrupted embedding job items", requeued)
+
+    _stop.clear()
+    _threads.clear()
+    for i in range(EMBED_JOB_WORKERS):
+        t = threading.Thread(target=_run, name=f"embed-jobs-{i}", daemon=True)
+        t.start()
+        _threads.append(t)
+
+
+def stop_workers():
+    _stop.set()
@@ -1,9 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
 from app.auth import require_role, require_any_role
-from app.ai.vector_store import vector_store
+from app.ai.vector_store import fingerprint, vector_store
+from app import db_async
 from app.db import patients_collection, audit_logs
 from app.services.phi_cleaner import redact_text
+from app.services.clinical_extractor import (
+    SOURCE_FIELDS,
+    extract_clinical_fields,
+    is_current,
+    vector_metadata
+)
+from app.services import embed_jobs
+from app.services.ingest import load_stored_text
+from app.services.patient_text import open_fields, seal_fields
+from app.utils import event_bus, executors
 import logging
 import re
 
@@ -12,11 +24,12 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/ai", tags=["AI"])
 
 @router.post("/embed")
-def embed_patient_data(
+async def embed_patient_data(
     payload: dict,
     user=Depends(require_role("doctor"))
 ):
-    """Embed patient text and add vector metadata. Returns 500 with clear message on failure."""
+    """Embed patient text and add vector metadata. Returns 500 with clear message on failure.
+    Model inference runs on the dedicated inference pool (503 + Retry-After when saturated)."""
     patient_id = payload.get("patient_id")
     text = payload.get("text")
 
@@ -24,79 +37,49 @@ def embed_patient_data(
         raise HTTPException(status_code=400, detail="patient_id and text required")
 
     # Fetch patient document to enrich vector metadata (age, bp, past history)
-    patient = patients_collection.find_one({"patient_id": patient_id})
+    patient = await db_async.patients_collection.find_one({"patient_id": patient_id}, {f: 1 for f in SOURCE_FIELDS})
+    open_fields(patient)
 
     metadata = {
         "uploaded_by": user["username"],
         "role": user["role"]
     }
 
+    # the cleaned text changes the source fields, so re-run the extraction stage once here
+    clinical = None
     if patient:
-        # age (non-PHI numeric) — prefer direct age, otherwise attempt DOB -> year extraction
-        if patient.get("age") is not None:
-            metadata["age"] = patient.get("age")
-        else:
-            # look for a 4-digit year in text like '1980' or '/04/1980' to estimate age
-            y = re.search(r"(19\d{2}|20\d{2})", " ".join(str(patient.get(k, "")) for k in ("original_text", "raw_text", "cleaned_text", "notes")))
-            if y:
-                try:
-                    birth_year = int(y.group(1))
-                    from datetime import datetime as _dt
-                    metadata["age"] = _dt.utcnow().year - birth_year
-                except Exception:
-                    pass
-
-        # search for BP and Past Medical History in stored text fields
-        text_fields = " ".join(str(patient.get(k, "")) for k in ("original_text", "raw_text", "cleaned_text", "chief_complaint", "notes"))
-
-        # current BP (e.g., 'BP: 120/80' or 'blood pressure 120/80')
-        m = re.search(r"\b(?:BP|Blood Pressure)[: ]+\s*(\d{2,3}/\d{2,3})", text_fields, re.IGNORECASE)
-        if m:
-            metadata["bp"] = m.group(1)
-
-        # Past Medical History — multiple heuristics
-        # 1) explicit 'Past Medical History: ...'
-        m2 = re.search(r"Past Medical History:\s*(.+?)(?:\n|$)", text_fields, re.IGNORECASE)
-        if m2:
-            metadata["past_history"] = m2.group(1).strip()
-        else:
-            # 2) 'History of X' or 'Hx: X' patterns
-            m3 = re.search(r"(?:History of|Hx[:\s]+)\s*([A-Za-z0-9\- ,/]+?)(?:[.,\n]|$)", text_fields, re.IGNORECASE)
-            if m3:
-                metadata["past_history"] = m3.group(1).strip()
-            else:
-                # 3) keyword based fallback (e.g., 'hypertension', 'diabetes')
-                keywords = []
-                for kw in ("hypertension", "diabetes", "asthma", "copd", "cancer", "stroke"):
-                    if re.search(rf"\b{kw}\b", text_fields, re.IGNORECASE):
-                        keywords.append(kw)
-                if keywords:
-                    metadata["past_history"] = ", ".join(keywords)
+        clinical = await executors.redaction.run(extract_clinical_fields, {**patient, "cleaned_text": text})
+        metadata.update(vector_metadata(clinical))
 
     try:
-        vector_id = vector_store.store(
+        vector_id = await executors.inference.run(
+            vector_store.store,
             patient_id=patient_id,
             text=text,
             metadata=metadata
         )
+    except HTTPException:
+        raise
     except Exception as e:
         # log and return a 500 with a short message
         raise HTTPException(status_code=500, detail=f"Embedding failed: {str(e)}")
 
-    patients_collection.update_one(
-        {"patient_id": patient_id},
-        {
-            "$set": {
-                "cleaned_text": text,
-                "vector_id": vector_id,
-                "status": "embedded"
-            }
-        }
-    )
+    update = {
+        "cleaned_text": text,
+        "vector_id": vector_id,
+        "vector_fingerprint": fingerprint(text),
+        "status": "embedded",
+        **({"clinical": clinical} if clinical else {})
+    }
+    if patient:
+        seal_fields(update, ids=[patient["_id"]])
+        await db_async.patients_collection.update_one({"_id": patient["_id"]}, {"$set": update})
 
     # ✅ AUDIT LOG — INSIDE FUNCTION (standardized)
     from app.utils.audit_logger import log_audit
-    log_audit(event="VECTOR_EMBEDDED", actor=user["username"], role=user["role"], patient_id=patient_id)
+    await run_in_threadpool(log_audit, event="VECTOR_EMBEDDED", actor=user["username"], role=user["role"], patient_id=patient_id)
+
+    event_bus.publish("patient_embedded", {"patient_id": patient_id, "vector_id": vector_id})
 
     return {
         "vector_id": vector_id,
@@ -105,74 +88,119 @@ def embed_patient_data(
 
 
 @router.post("/reembed")
-def reembed_patient(
+async def reembed_patient(
     payload: dict,
     user=Depends(require_role("doctor"))
 ):
     """Re-run embedding for an existing patient to refresh vector metadata.
-    Payload: {"patient_id": "PAT-..."}
-    Protected: doctor role required."""
+    Payload: {"patient_id": "PAT-...", "force": false}
+    Skips the model when the text, extractor and model are unchanged since the last embed
+    (unless force=true). Protected: doctor role required."""
     patient_id = payload.get("patient_id")
 
     if not patient_id:
         raise HTTPException(status_code=400, detail="patient_id required")
 
-    patient = patients_collection.find_one({"patient_id": patient_id})
+    patient = await db_async.patients_collection.find_one({"patient_id": patient_id}, {f: 1 for f in SOURCE_FIELDS + ("clinical", "text_file_id", "text_encoding", "vector_id", "vector_fingerprint")})
     if not patient:
         raise HTTPException(status_code=404, detail="patient not found")
+    open_fields(patient)
 
-    # build the same metadata extraction logic used by /embed
-    metadata = {"uploaded_by": user["username"], "role": user["role"]}
+    # reuse the stored extraction unless the extractor has changed since
+    clinical = patient.get("clinical")
+    refreshed = not is_current(clinical)
+    if refreshed:
+        clinical = await executors.redaction.run(extract_clinical_fields, patient)
 
-    # age
-    if patient.get("age") is not None:
-        metadata["age"] = patient.get("age")
-    else:
-        y = re.search(r"(19\d{2}|20\d{2})", " ".join(str(patient.get(k, "")) for k in ("original_text", "raw_text", "cleaned_text", "notes")))
-        if y:
-            try:
-                birth_year = int(y.group(1))
-                from datetime import datetime as _dt
-                metadata["age"] = _dt.utcnow().year - birth_year
-            except Exception:
-                pass
-
-    text_fields = " ".join(str(patient.get(k, "")) for k in ("original_text", "raw_text", "cleaned_text", "chief_complaint", "notes"))
-
-    m = re.search(r"\b(?:BP|Blood Pressure)[: ]+\s*(\d{2,3}/\d{2,3})", text_fields, re.IGNORECASE)
-    if m:
-        metadata["bp"] = m.group(1)
-
-    m2 = re.search(r"Past Medical History:\s*(.+?)(?:\n|$)", text_fields, re.IGNORECASE)
-    if m2:
-        metadata["past_history"] = m2.group(1).strip()
-    else:
-        m3 = re.search(r"(?:History of|Hx[:\s]+)\s*([A-Za-z0-9\- ,/]+?)(?:[.,\n]|$)", text_fields, re.IGNORECASE)
-        if m3:
-            metadata["past_history"] = m3.group(1).strip()
-        else:
-            # keyword fallback
-            keywords = []
-            for kw in ("hypertension", "diabetes", "asthma", "copd", "cancer", "stroke"):
-                if re.search(rf"\b{kw}\b", text_fields, re.IGNORECASE):
-                    keywords.append(kw)
-            if keywords:
-                metadata["past_history"] = ", ".join(keywords)
+    metadata = {"uploaded_by": user["username"], "role": user["role"], **vector_metadata(clinical)}
 
     # use cleaned_text if available, otherwise raw_text
     text_for_embed = patient.get("cleaned_text") or patient.get("raw_text") or patient.get("original_text") or ""
+    if not text_for_embed and patient.get("text_file_id"):
+        # large upload: the body lives in GridFS rather than on the document
+        text_for_embed = await load_stored_text(patient["text_file_id"], patient.get("text_encoding") or "utf-8")
+
+    fp = fingerprint(text_for_embed)
+    if not payload.get("force") and patient.get("vector_fingerprint") == fp \
+            and vector_store.is_fresh(patient.get("vector_id"), fp):
+        from app.utils.audit_logger import log_audit
+        await run_in_threadpool(log_audit, event="VECTOR_REEMBED_SKIPPED", actor=user["username"], role=user["role"], patient_id=patient_id)
+        return {"vector_id": patient["vector_id"], "status": "embedded", "skipped": True}
 
     try:
-        vector_id = vector_store.store(patient_id=patient_id, text=text_for_embed, metadata=metadata)
+        vector_id = await executors.inference.run(vector_store.store, patient_id=patient_id, text=text_for_embed, metadata=metadata)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Re-embed failed: {str(e)}")
 
-    patients_collection.update_one({"patient_id": patient_id}, {"$set": {"vector_id": vector_id, "status": "embedded"}})
+    update = {"vector_id": vector_id, "vector_fingerprint": fp, "status": "embedded"}
+    if refreshed:
+        update["clinical"] = clinical
+    await db_async.patients_collection.update_one({"patient_id": patient_id}, {"$set": update})
 
     from app.utils.audit_logger import log_audit
-    log_audit(event="VECTOR_REEMBEDDED", actor=user["username"], role=user["role"], patient_id=patient_id)
+    await run_in_threadpool(log_audit, event="VECTOR_REEMBEDDED", actor=user["username"], role=user["role"], patient_id=patient_id)
+
+    event_bus.publish("patient_embedded", {"patient_id": patient_id, "vector_id": vector_id})
 
-    return {"vector_id": vector_id, "status": "embedded"}
+    return {"vector_id": vector_id, "status": "embedded", "skipped": False}
+
+
+@router.post("/jobs", status_code=202)
+async def submit_embed_job(
+    payload: dict,
+    user=Depends(require_role("doctor"))
+):
+    """Queue a bulk embed / re-embed job and return immediately.
+    Payload: {"kind": "embed" | "reembed" | "refresh", "patient_ids": [...]} or {"kind": ..., "all": true}
+    `refresh` re-encodes only stale vectors (changed text, extractor or model) and reports the rest as skipped.
+    Poll GET /ai/jobs/{job_id} for progress; patient status moves queued -> embedding -> embedded."""
+    kind = payload.get("kind", "reembed")
+    if payload.get("all"):
+        patient_ids = await db_async.patients_collection.distinct("patient_id")
+    else:
+        patient_ids = payload.get("patient_ids")
+        if not isinstance(patient_ids, list) or not patient_ids:
+            raise HTTPException(status_code=400, detail="patient_ids (list) or all=true required")
+
+    try:
+        job = await run_in_threadpool(embed_jobs.submit, kind, patient_ids, user)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    from app.utils.audit_logger import log_audit
+    await run_in_threadpool(
+        log_audit, event="EMBED_JOB_SUBMITTED", actor=user["username"], role=user["role"],
+        detail={"note": f"{job['job_id']}: {kind} of {job['total']} patients"}
+    )
+
+    return job
+
+
+@router.get("/jobs")
+async def list_embed_jobs(
+    limit: int = 20,
+    user=Depends(require_any_role("doctor", "admin"))
+):
+    """Recent jobs with progress (doctors see their own, admins see all)."""
+    submitted_by = None if user["role"] == "admin" else user["username"]
+    jobs = await run_in_threadpool(embed_jobs.list_jobs, min(max(limit, 1), 100), submitted_by)
+    return {"jobs": jobs}
+
+
+@router.get("/jobs/{job_id}")
+async def get_embed_job(
+    job_id: str,
+    user=Depends(require_any_role("doctor", "admin"))
+):
+    """Progress of one job: counts per item state plus the first failures."""
+    job = await run_in_threadpool(embed_jobs.get_job, job_id, True)
+    if not job or (user["role"] != "admin" and job["submitted_by"] != user["username"]):
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
 
 
 @router.post("/analysis")
@@ -189,9 +217,14 @@ def ai_analysis(
     patient_id = payload.get("patient_id") if isinstance(payload, dict) else None
 
     # find latest embedded
-    latest = patients_collection.find_one({"status": "embedded"}, sort=[("created_at", -1)])
+    latest = patients_collection.find_one(
+        {"status": "embedded"},
+        {"patient_id": 1, "cleaned_text": 1},
+        sort=[("created_at", -1)]
+    )
     if not latest:
         raise HTTPException(status_code=404, detail="No embedded patient available for analysis")
+    open_fields(latest)
 
     if patient_id and patient_id != latest.get("patient_id"):
         raise HTTPException(status_code=400, detail="Analysis allowed only on the latest embedded patient record")
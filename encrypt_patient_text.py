@@ -0,0 +1,125 @@
+# app/scripts/encrypt_patient_text.py
+"""Online migration: seal plaintext patient text fields, or rotate their key.
+
+Default mode compresses and encrypts every raw_text / original_text /
+cleaned_text still stored as a plain string (see app.services.patient_text),
+then re-writes GridFS bodies spilled before encryption existed (files
+without `encryption` metadata) as encrypted files and repoints the patient
+documents at them. With --rotate, envelopes written under an older key id,
+or before envelopes were bound to their document _id, are re-encrypted
+with the active key (AES_ACTIVE_KEY_ID). Documents are processed in small
+batches by _id and every update is guarded on the field still holding the
+value that was read, so concurrent writers are never clobbered. Re-running
+is a no-op once everything is converted.
+
+    python -m app.scripts.encrypt_patient_text [--batch-size 200] [--rotate]
+"""
+import argparse
+import logging
+from gridfs import GridFSBucket
+from pymongo import UpdateOne
+from app.db import db, patients_collection
+from app.db_indexes import PATIENT_TEXT_FIELDS
+from app.services.ingest import GRIDFS_BUCKET, encrypt_stored_text
+from app.services.patient_text import rotate_fields, seal_fields
+
+logger = logging.getLogger(__name__)
+
+
+def _migrate(query: dict, convert, batch_size: int):
+    updated = 0
+    last_id = None
+    projection = {f: 1 for f in PATIENT_TEXT_FIELDS}  # _id is included: it is bound into the envelopes
+
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+
+        batch = list(patients_collection.find(page, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        originals = [dict(doc) for doc in batch]
+        ops = []
+        for original, doc in zip(originals, convert(batch)):
+            fields = [f for f in PATIENT_TEXT_FIELDS if doc.get(f) is not original.get(f)]
+            if not fields:
+                continue
+            ops.append(UpdateOne(
+                {"_id": doc["_id"], **{f: original[f] for f in fields}},
+                {"$set": {f: doc[f] for f in fields}}
+            ))
+
+        if ops:
+            result = patients_collection.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        logger.info("patient text migration: %d documents updated", updated)
+
+    return {"updated": updated}
+
+
+def _sealed(batch):
+    seal_fields(*batch)
+    return batch
+
+
+def _rotated(batch):
+    rotate_fields(*batch)
+    return batch
+
+
+def encrypt_plaintext(batch_size: int = 200):
+    """Seal every text field still stored as a plain string."""
+    query = {"$or": [{f: {"$type": "string"}} for f in PATIENT_TEXT_FIELDS]}
+    return _migrate(query, _sealed, batch_size)
+
+
+def encrypt_stored_bodies(batch_size: int = 200):
+    """Replace plaintext GridFS bodies with encrypted copies and repoint their documents."""
+    files = db[f"{GRIDFS_BUCKET}.files"]
+    bucket = GridFSBucket(db, bucket_name=GRIDFS_BUCKET)
+    converted = 0
+    last_id = None
+
+    while True:
+        query = {"metadata.encryption": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = [f["_id"] for f in files.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size)]
+        if not batch:
+            break
+
+        for old_id in batch:
+            new_id = encrypt_stored_text(old_id)
+            # repoint before deleting, so no document references a missing file
+            patients_collection.update_many({"text_file_id": old_id}, {"$set": {"text_file_id": new_id}})
+            bucket.delete(old_id)
+            converted += 1
+
+        last_id = batch[-1]
+        logger.info("patient text migration: %d GridFS bodies encrypted", converted)
+
+    return {"converted": converted}
+
+
+def rotate_keys(batch_size: int = 200):
+    """Re-encrypt envelopes under an older key id or not yet bound to their document."""
+    query = {"$or": [{f: {"$type": "binData"}} for f in PATIENT_TEXT_FIELDS]}
+    return _migrate(query, _rotated, batch_size)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--rotate", action="store_true", help="re-encrypt with the active key instead")
+    args = parser.parse_args()
+    if args.rotate:
+        print("✅ Migration finished:", rotate_keys(args.batch_size))
+    else:
+        print("✅ Migration finished:", {**encrypt_plaintext(args.batch_size),
+                                         "gridfs": encrypt_stored_bodies(args.batch_size)})
@@ -1,27 +1,129 @@
 # app/services/encryption.py
+"""AES-GCM encryption for PHI at rest.
+
+`cipher` holds one AESGCM object per configured key, built once at import,
+and emits a compact binary envelope instead of hex strings:
+
+    version (1 byte) | key_id (1 byte) | nonce (12 bytes) | ciphertext + tag
+
+Keys come from AES_KEYS ("1:<hex>,2:<hex>"), falling back to AES_KEY as
+key id 1. New data is encrypted with the active key (AES_ACTIVE_KEY_ID,
+default: highest id); older envelopes still decrypt as long as their key
+is configured, and `needs_rotation` / `reencrypt_many` let a background
+job move them to the active key.
+
+`encrypt_many` / `decrypt_many` spread large lists over a small thread
+pool — AES-GCM in `cryptography` releases the GIL while it works. Their
+`aad` is either one value for every buffer or a list with one per buffer.
+"""
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from concurrent.futures import ThreadPoolExecutor
 import os, binascii
-from app.config import AES_KEY_HEX
+from app.config import AES_KEY_HEX, AES_KEYS, AES_ACTIVE_KEY_ID, CIPHER_WORKERS
+
+ENVELOPE_VERSION = 1
+NONCE_SIZE = 12
+HEADER_SIZE = 2 + NONCE_SIZE
+# below this many bytes in a batch the pool costs more than it saves
+PARALLEL_MIN_BYTES = 256 * 1024
+
 
-def _key_bytes():
-    # AES_KEY_HEX is hex string of 16 bytes (32 hex chars)
-    k = AES_KEY_HEX
+def _parse_key(k: str) -> bytes:
+    # hex string of 16/24/32 bytes; anything else is used as raw text (legacy behaviour)
     try:
-        b = binascii.unhexlify(k)
+        return binascii.unhexlify(k)
     except Exception:
-        b = k.encode()[:16]
-    return b
+        return k.encode()[:16]
+
+
+def _configured_keys() -> dict:
+    keys = {}
+    for part in filter(None, (p.strip() for p in AES_KEYS.split(","))):
+        kid, _, hex_key = part.partition(":")
+        keys[int(kid)] = _parse_key(hex_key.strip())
+    if not keys:
+        keys[1] = _parse_key(AES_KEY_HEX)
+    return keys
+
+
+class CipherService:
+    def __init__(self, keys: dict, active_key_id: int = None):
+        if not keys:
+            raise ValueError("at least one key is required")
+        for kid in keys:
+            if not 0 < kid < 256:
+                raise ValueError(f"key id {kid} out of range 1..255")
+        self._ciphers = {kid: AESGCM(key) for kid, key in keys.items()}
+        self.active_key_id = active_key_id or max(keys)
+        if self.active_key_id not in self._ciphers:
+            raise ValueError(f"active key id {self.active_key_id} is not configured")
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=CIPHER_WORKERS, thread_name_prefix="cipher")
+        return self._pool
+
+    def encrypt(self, data: bytes, aad: bytes = None) -> bytes:
+        nonce = os.urandom(NONCE_SIZE)
+        ct = self._ciphers[self.active_key_id].encrypt(nonce, data, aad)
+        return bytes((ENVELOPE_VERSION, self.active_key_id)) + nonce + ct
+
+    def decrypt(self, envelope: bytes, aad: bytes = None) -> bytes:
+        view = memoryview(envelope)  # bytes / bson.Binary; slices without copying
+        if len(view) < HEADER_SIZE or view[0] != ENVELOPE_VERSION:
+            raise ValueError("not an encryption envelope")
+        cipher = self._ciphers.get(view[1])
+        if cipher is None:
+            raise ValueError(f"unknown key id {view[1]}")
+        return cipher.decrypt(view[2:HEADER_SIZE], view[HEADER_SIZE:], aad)
+
+    def _map(self, fn, buffers, aad):
+        buffers = list(buffers)
+        aads = aad if isinstance(aad, list) else [aad] * len(buffers)
+        if len(buffers) < 2 or sum(len(b) for b in buffers) < PARALLEL_MIN_BYTES:
+            return [fn(b, a) for b, a in zip(buffers, aads)]
+        return list(self._executor().map(fn, buffers, aads))
+
+    def encrypt_many(self, buffers, aad: bytes = None) -> list:
+        return self._map(self.encrypt, buffers, aad)
+
+    def decrypt_many(self, envelopes, aad: bytes = None) -> list:
+        return self._map(self.decrypt, envelopes, aad)
+
+    def key_id(self, envelope: bytes) -> int:
+        return envelope[1]
+
+    def needs_rotation(self, envelope: bytes) -> bool:
+        return self.key_id(envelope) != self.active_key_id
+
+    def reencrypt_many(self, envelopes, aad: bytes = None) -> list:
+        """Move envelopes to the active key (already-current ones are returned unchanged)."""
+        return self._map(
+            lambda e, a: self.encrypt(self.decrypt(e, a), a) if self.needs_rotation(e) else bytes(e),
+            envelopes, aad
+        )
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+cipher = CipherService(_configured_keys(), AES_ACTIVE_KEY_ID)
+
+# legacy hex format below always used AES_KEY; new code should use `cipher`
+_legacy_aes = AESGCM(_parse_key(AES_KEY_HEX))
+
 
 def encrypt_bytes(plaintext_bytes: bytes) -> dict:
-    key = _key_bytes()
-    aes = AESGCM(key)
-    nonce = os.urandom(12)
+    aes = _legacy_aes
+    nonce = os.urandom(NONCE_SIZE)
     ct = aes.encrypt(nonce, plaintext_bytes, None)
     return {"nonce": binascii.hexlify(nonce).decode(), "ciphertext": binascii.hexlify(ct).decode()}
 
 def decrypt_bytes(nonce_hex: str, ct_hex: str) -> bytes:
-    key = _key_bytes()
-    aes = AESGCM(key)
+    aes = _legacy_aes
     nonce = binascii.unhexlify(nonce_hex)
     ct = binascii.unhexlify(ct_hex)
     pt = aes.decrypt(nonce, ct, None)
@@ -0,0 +1,61 @@
+# app/utils/event_bus.py
+"""In-process publish/subscribe bus feeding the dashboard SSE stream.
+
+Publishers (the audit writer, the embed routes) run in worker threads, so
+`publish` hands each event to the subscriber's event loop with
+`call_soon_threadsafe`. Subscribers are bounded asyncio queues; a slow
+client loses its oldest events rather than blocking publishers.
+"""
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers = set()
+_lock = threading.Lock()
+
+
+class Subscription:
+    def __init__(self, topics=None):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.topics = set(topics) if topics else None
+
+    def _deliver(self, event):
+        if self.queue.full():
+            # drop the oldest event so the newest state always gets through
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        with _lock:
+            _subscribers.discard(self)
+
+
+def subscribe(topics=None) -> Subscription:
+    """Register a subscriber on the running event loop."""
+    sub = Subscription(topics)
+    with _lock:
+        _subscribers.add(sub)
+    return sub
+
+
+def publish(topic: str, data: dict):
+    """Fan an event out to every subscriber; safe to call from any thread."""
+    event = {"topic": topic, "data": data}
+    with _lock:
+        subs = list(_subscribers)
+    for sub in subs:
+        if sub.topics is not None and topic not in sub.topics:
+            continue
+        try:
+            sub.loop.call_soon_threadsafe(sub._deliver, event)
+        except RuntimeError:
+            # loop already closed; the subscriber is gone
+            sub.close()
@@ -0,0 +1,139 @@
+# app/utils/executors.py
+"""Dedicated, size-bounded pools for CPU-heavy work.
+
+Model inference and PHI redaction used to run inside Starlette's shared
+threadpool, so a burst of AI calls starved logins and dashboard reads.
+They now run on their own pools:
+
+- `inference`: threads for embedding / similarity search (the model
+  releases the GIL while encoding).
+- `redaction`: processes for regex redaction and answer generation.
+- `passwords`: threads for bcrypt verification at login (bcrypt releases
+  the GIL), so a login burst cannot stall other endpoints.
+
+Each pool admits at most `workers + queue` tasks; beyond that callers get
+503 with a Retry-After header instead of queueing without bound.
+
+The redaction processes are started with forkserver (spawn where that is
+unavailable): by the time the pool is first used the API process already
+runs threads, and forking it could copy a lock held by one of them.
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from app.config import (
+    INFERENCE_WORKERS,
+    INFERENCE_QUEUE,
+    REDACTION_WORKERS,
+    REDACTION_QUEUE,
+    PASSWORD_WORKERS,
+    PASSWORD_QUEUE,
+    EXECUTOR_RETRY_AFTER_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def process_context():
+    """Start method for process pools created after threads are running (forkserver, else spawn)."""
+    return multiprocessing.get_context(
+        "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, factory, workers: int, queue: int):
+        self.name = name
+        self.workers = workers
+        self.capacity = workers + queue
+        self._factory = factory
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # created lazily so importing never spawns worker processes
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory(self.workers)
+            return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            logger.warning("%s pool saturated (%d in flight)", self.name, self.capacity)
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server busy ({self.name}); please retry shortly",
+                headers={"Retry-After": str(EXECUTOR_RETRY_AFTER_SECONDS)}
+            )
+        try:
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_flight += 1
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn` on this pool and await its result (503 when saturated)."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+inference = BoundedExecutor(
+    "inference",
+    lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix="inference"),
+    INFERENCE_WORKERS,
+    INFERENCE_QUEUE,
+)
+
+redaction = BoundedExecutor(
+    "redaction",
+    lambda n: ProcessPoolExecutor(max_workers=n, mp_context=process_context()),
+    REDACTION_WORKERS,
+    REDACTION_QUEUE,
+)
+
+passwords = BoundedExecutor(
+    "passwords",
+    lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix="passwords"),
+    PASSWORD_WORKERS,
+    PASSWORD_QUEUE,
+)
+
+POOLS = (inference, redaction, passwords)
+
+
+def stats():
+    return {p.name: p.stats() for p in POOLS}
+
+
+def shutdown():
+    for p in POOLS:
+        p.shutdown()
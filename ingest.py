@@ -0,0 +1,292 @@
+# app/services/ingest.py
+"""Streaming ingestion of uploaded patient records.
+
+Uploads are read in fixed-size chunks, decoded incrementally (BOM-based
+encoding detection, UTF-8 by default, latin-1 if the first chunk is not
+valid UTF-8) and the dashboard fields are extracted line by line as the text streams
+past. Small bodies are kept inline on the patient document as before;
+once a body exceeds INLINE_TEXT_LIMIT its raw bytes are zlib-compressed
+into GridFS as they arrive and only the extracted summary stays on the
+document. Peak memory per upload is bounded by INLINE_TEXT_LIMIT plus one
+chunk, whatever the file size.
+
+Spilled bodies are PHI too: each compressed piece is written as a
+length-prefixed AES-GCM envelope (app.services.encryption), and the readers
+below undo the framing, decryption and compression as the chunks stream in.
+Inline bodies are sealed by the caller (app.services.patient_text).
+"""
+import codecs
+import logging
+import re
+import zlib
+from gridfs import GridFSBucket
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from app import db_async
+from app.services.encryption import cipher
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# bodies up to this size stay inline on the patient document
+INLINE_TEXT_LIMIT = 256 * 1024
+# leading text kept for the clinical field extraction of large uploads
+HEAD_CHARS = 64 * 1024
+# an unterminated line is scanned and trimmed beyond this many characters
+MAX_LINE_CHARS = 8 * 1024
+# kept from a trimmed line so a label cut at the trim point is still matched
+LINE_OVERLAP = 256
+GRIDFS_BUCKET = "patient_texts"
+GRIDFS_AAD = b"patient_texts"
+FRAME_HEADER = 4
+
+# dashboard fields (first match wins); shared with app.routes.upload.extract_fields
+FIELD_PATTERNS = {
+    "patient_name": re.compile(r"Patient Name:\s*([A-Za-z ]+)", re.IGNORECASE),
+    "age": re.compile(r"Age:\s*(\d+)", re.IGNORECASE),
+    "gender": re.compile(r"Gender:\s*(Male|Female|Other)", re.IGNORECASE),
+    "chief_complaint": re.compile(r"Chief Complaint:\s*([^A-Z]+)", re.IGNORECASE),
+}
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def _bucket():
+    return AsyncIOMotorGridFSBucket(db_async.db, bucket_name=GRIDFS_BUCKET)
+
+
+def _frame(data: bytes) -> bytes:
+    if not data:
+        return b""
+    envelope = cipher.encrypt(data, GRIDFS_AAD)
+    return len(envelope).to_bytes(FRAME_HEADER, "big") + envelope
+
+
+class StoredTextReader:
+    """Turns the raw GridFS chunks of a stored body back into text, incrementally."""
+
+    def __init__(self, metadata, encoding: str = "utf-8"):
+        self.encrypted = bool((metadata or {}).get("encryption"))
+        self._buffer = bytearray()
+        self._decompressor = zlib.decompressobj()
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+    def _frames(self, chunk: bytes):
+        if not self.encrypted:
+            yield chunk
+            return
+        self._buffer += chunk
+        while len(self._buffer) >= FRAME_HEADER:
+            size = int.from_bytes(self._buffer[:FRAME_HEADER], "big")
+            if len(self._buffer) < FRAME_HEADER + size:
+                break
+            yield cipher.decrypt(bytes(self._buffer[FRAME_HEADER:FRAME_HEADER + size]), GRIDFS_AAD)
+            del self._buffer[:FRAME_HEADER + size]
+
+    def feed(self, chunk: bytes) -> str:
+        return "".join(self._decoder.decode(self._decompressor.decompress(f)) for f in self._frames(chunk))
+
+    def close(self) -> str:
+        if self._buffer:
+            raise ValueError("truncated encrypted text body")
+        return self._decoder.decode(self._decompressor.flush(), final=True)
+
+
+class StreamDecoder:
+    """Incremental bytes -> str decoder with BOM detection and latin-1 fallback.
+
+    The encoding is settled by the first chunk: spilled bodies are stored as
+    raw bytes and read back with the recorded encoding, so it must not change
+    once earlier chunks are written. Invalid bytes after that are replaced.
+    """
+
+    def __init__(self):
+        self.encoding = None
+        self._decoder = None
+
+    def feed(self, data: bytes, final: bool = False) -> str:
+        if self._decoder is not None:
+            return self._decoder.decode(data, final)
+
+        self.encoding = next((enc for bom, enc in _BOMS if data.startswith(bom)), "utf-8")
+        self._decoder = codecs.getincrementaldecoder(self.encoding)()
+        try:
+            text = self._decoder.decode(data, final)
+        except UnicodeDecodeError:
+            # not valid in the detected encoding; latin-1 accepts any byte
+            logger.info("upload is not valid %s; falling back to latin-1", self.encoding)
+            self.encoding = "latin-1"
+            self._decoder = codecs.getincrementaldecoder("latin-1")()
+            text = self._decoder.decode(data, final)
+        self._decoder.errors = "replace"
+        return text
+
+
+class LineFieldExtractor:
+    """Applies FIELD_PATTERNS to complete lines as decoded text arrives.
+
+    Each line is scanned together with the one before it, so a value on the
+    line after its label ("Patient Name:\\nJohn") is still found; a match that
+    runs to the end of that window is held until the next line shows whether
+    it continues. Lines end at \\n, \\r\\n or \\r, and an unterminated line is
+    scanned and trimmed once it passes MAX_LINE_CHARS, so memory stays
+    bounded whatever the line endings.
+    """
+
+    def __init__(self):
+        self.fields = {k: None for k in FIELD_PATTERNS}
+        self._pending = {}
+        self._prev = ""
+        self._partial = ""
+
+    def _scan(self, line: str, final: bool = False):
+        window = f"{self._prev}\n{line}" if self._prev else line
+        self._prev = line
+        for name, pattern in FIELD_PATTERNS.items():
+            if self.fields[name] is not None:
+                continue
+            m = pattern.search(window)
+            if m is None:
+                if name in self._pending:
+                    self.fields[name] = self._pending.pop(name)
+            elif final or m.end() < len(window):
+                self.fields[name] = m.group(1)
+                self._pending.pop(name, None)
+            else:
+                self._pending[name] = m.group(1)
+
+    def feed(self, text: str):
+        buffer = self._partial + text
+        # a \r at the end may be the first half of \r\n
+        held = "\r" if buffer.endswith("\r") else ""
+        lines = _LINE_BREAK.split(buffer[:len(buffer) - len(held)])
+        self._partial = lines.pop() + held
+        for line in lines:
+            self._scan(line)
+        if len(self._partial) > MAX_LINE_CHARS:
+            self._scan(self._partial)
+            self._partial = self._partial[-LINE_OVERLAP:]
+
+    def close(self):
+        self._scan(self._partial.rstrip("\r"), final=True)
+        self._partial = ""
+        self.fields.update((k, v) for k, v in self._pending.items() if self.fields[k] is None)
+        self._pending.clear()
+        return self.fields
+
+
+async def ingest_upload(file, patient_id: str) -> dict:
+    """Stream an UploadFile through decoding, extraction and storage.
+
+    Returns {"text", "file_id", "size", "encoding", "fields", "head"} where
+    exactly one of `text` (inline body) or `file_id` (GridFS) is set.
+    """
+    decoder = StreamDecoder()
+    extractor = LineFieldExtractor()
+    raw_parts, text_parts, head = [], [], []
+    head_len = 0
+    size = 0
+    grid_in = None
+    compressor = None
+
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        final = not chunk
+        text = decoder.feed(chunk, final=final)
+        extractor.feed(text)
+
+        if head_len < HEAD_CHARS and text:
+            head.append(text[:HEAD_CHARS - head_len])
+            head_len += len(head[-1])
+
+        if grid_in is None:
+            raw_parts.append(chunk)
+            text_parts.append(text)
+        size += len(chunk)
+
+        if grid_in is None and size > INLINE_TEXT_LIMIT:
+            # too large to keep inline: spill what we have and stream the rest
+            compressor = zlib.compressobj()
+            grid_in = _bucket().open_upload_stream(
+                f"{patient_id}.txt.z",
+                metadata={"patient_id": patient_id, "compression": "zlib", "encryption": "aes-gcm"}
+            )
+            await grid_in.write(_frame(compressor.compress(b"".join(raw_parts))))
+            raw_parts, text_parts = [], []
+        elif grid_in is not None and chunk:
+            await grid_in.write(_frame(compressor.compress(chunk)))
+
+        if final:
+            break
+
+    fields = extractor.close()
+    result = {
+        "text": None,
+        "file_id": None,
+        "size": size,
+        "encoding": decoder.encoding,
+        "fields": fields,
+        "head": "".join(head),
+    }
+
+    if grid_in is not None:
+        await grid_in.write(_frame(compressor.flush()))
+        await grid_in.close()
+        result["file_id"] = grid_in._id
+        logger.info("stored %d byte upload for %s in GridFS", size, patient_id)
+    else:
+        result["text"] = "".join(text_parts)
+
+    return result
+
+
+async def load_stored_text(file_id, encoding: str = "utf-8") -> str:
+    """Read back, decompress and decode a body stored by ingest_upload."""
+    grid_out = await _bucket().open_download_stream(file_id)
+    reader = StoredTextReader(grid_out.metadata, encoding)
+    parts = []
+    while True:
+        chunk = await grid_out.readchunk()
+        if not chunk:
+            break
+        parts.append(reader.feed(chunk))
+    parts.append(reader.close())
+    return "".join(parts)
+
+
+def encrypt_stored_text(file_id):
+    """Re-write a body spilled before encryption as framed envelopes; returns the new file id."""
+    from app.db import db
+
+    bucket = GridFSBucket(db, bucket_name=GRIDFS_BUCKET)
+    grid_out = bucket.open_download_stream(file_id)
+    metadata = {**(grid_out.metadata or {}), "encryption": "aes-gcm"}
+    # the stored zlib stream is framed as is; the reader decompresses across frames
+    with bucket.open_upload_stream(grid_out.filename, metadata=metadata) as grid_in:
+        while True:
+            chunk = grid_out.readchunk()
+            if not chunk:
+                break
+            grid_in.write(_frame(chunk))
+    return grid_in._id
+
+
+def read_stored_text(file_id, encoding: str = "utf-8") -> str:
+    """Blocking variant of load_stored_text for worker threads and scripts."""
+    from app.db import db
+
+    grid_out = GridFSBucket(db, bucket_name=GRIDFS_BUCKET).open_download_stream(file_id)
+    reader = StoredTextReader(grid_out.metadata, encoding)
+    parts = []
+    while True:
+        chunk = grid_out.readchunk()
+        if not chunk:
+            break
+        parts.append(reader.feed(chunk))
+    parts.append(reader.close())
+    return "".join(parts)
@@ -1,3 +1,37 @@
+# app/ai/llm_client.py
+"""LLM access.
+
+`call_llm` is the blocking one-shot call. `stream_llm` is the async
+generator interface used by streaming endpoints: a real model is plugged
+in with `set_stream_backend(fn)`, where `fn(prompt)` is an async generator
+of text chunks. Until one is registered, stream_llm yields call_llm's
+answer as a single chunk, computed off the event loop.
+"""
+from fastapi.concurrency import run_in_threadpool
+
+
 def call_llm(prompt: str) -> str:
     # Hackathon-safe dummy LLM
     return "Based on the patient data, chest pain radiating to the left arm with hypertension history may indicate a cardiac issue. Immediate medical evaluation is advised."
+
+
+_stream_backend = None
+
+
+def set_stream_backend(backend):
+    """Register `backend(prompt) -> async iterator of str` (None restores the default)."""
+    global _stream_backend
+    _stream_backend = backend
+
+
+def has_stream_backend() -> bool:
+    return _stream_backend is not None
+
+
+async def stream_llm(prompt: str):
+    if _stream_backend is None:
+        yield await run_in_threadpool(call_llm, prompt)
+        return
+    async for chunk in _stream_backend(prompt):
+        if chunk:
+            yield chunk
@@ -0,0 +1,121 @@
+# app/utils/login_guard.py
+"""In-memory brute-force guard for /auth/login.
+
+Failed attempts are tracked per (username, client IP) pair and per client
+IP. After a few free failures each further failure doubles a lockout window
+(capped), and locked-out keys are rejected with 429 before any bcrypt work
+is done. A username is never locked out on its own, so guessing against a
+known account from one address cannot lock its owner out everywhere. A
+successful login clears the pair's counter.
+
+The client IP is the socket peer, unless the peer is one of
+TRUSTED_PROXIES: then the right-most X-Forwarded-For entry that is not a
+trusted proxy is used. Without TRUSTED_PROXIES, clients behind one reverse
+proxy share its address and the per-IP limit applies to all of them.
+"""
+import ipaddress
+import threading
+import time
+from fastapi import HTTPException, Request
+from app.config import (
+    LOGIN_FREE_FAILURES_PER_USER,
+    LOGIN_FREE_FAILURES_PER_IP,
+    LOGIN_BACKOFF_BASE_SECONDS,
+    LOGIN_BACKOFF_MAX_SECONDS,
+    TRUSTED_PROXIES,
+)
+
+# forget keys that have been quiet this long
+IDLE_RESET_SECONDS = 3600
+MAX_TRACKED_KEYS = 50000
+
+_lock = threading.Lock()
+# key -> [failures, blocked_until, last_failure]
+_attempts = {}
+
+_trusted_proxies = [ipaddress.ip_network(p.strip(), strict=False) for p in TRUSTED_PROXIES.split(",") if p.strip()]
+
+
+def _is_trusted(ip: str) -> bool:
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(addr in net for net in _trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    """Client address, honouring X-Forwarded-For only when set by a trusted proxy."""
+    ip = request.client.host if request.client else "unknown"
+    if not _is_trusted(ip):
+        return ip
+    for hop in reversed(request.headers.get("x-forwarded-for", "").split(",")):
+        hop = hop.strip()
+        if hop and not _is_trusted(hop):
+            return hop
+    return ip
+
+
+def _user_key(username: str, ip: str) -> str:
+    return f"user:{(username or '').lower()}@{ip or 'unknown'}"
+
+
+def _keys(username: str, ip: str):
+    return (
+        (_user_key(username, ip), LOGIN_FREE_FAILURES_PER_USER),
+        (f"ip:{ip or 'unknown'}", LOGIN_FREE_FAILURES_PER_IP),
+    )
+
+
+def _prune(now):
+    if len(_attempts) < MAX_TRACKED_KEYS:
+        return
+    for key in [k for k, v in _attempts.items() if now - v[2] > IDLE_RESET_SECONDS]:
+        del _attempts[key]
+
+
+def check(username: str, ip: str):
+    """Raise 429 (with Retry-After) if the username from this IP, or the IP, is locked out."""
+    now = time.monotonic()
+    wait = 0
+    with _lock:
+        for key, _free in _keys(username, ip):
+            entry = _attempts.get(key)
+            if entry and entry[1] > now:
+                wait = max(wait, entry[1] - now)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many failed login attempts; try again later",
+            headers={"Retry-After": str(int(wait) + 1)}
+        )
+
+
+def record_failure(username: str, ip: str):
+    now = time.monotonic()
+    with _lock:
+        _prune(now)
+        for key, free in _keys(username, ip):
+            entry = _attempts.get(key)
+            if entry is None or now - entry[2] > IDLE_RESET_SECONDS:
+                entry = _attempts[key] = [0, 0.0, now]
+            entry[0] += 1
+            entry[2] = now
+            over = entry[0] - free
+            if over > 0:
+                delay = min(LOGIN_BACKOFF_BASE_SECONDS * (2 ** (over - 1)), LOGIN_BACKOFF_MAX_SECONDS)
+                entry[1] = now + delay
+
+
+def record_success(username: str, ip: str):
+    with _lock:
+        _attempts.pop(_user_key(username, ip), None)
+
+
+def stats():
+    now = time.monotonic()
+    with _lock:
+        return {
+            "tracked": len(_attempts),
+            "locked": sum(1 for v in _attempts.values() if v[1] > now),
+        }
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uuid
@@ -11,8 +12,11 @@ from app.db import patients_collection
 # Auth / utils
 from app.auth import require_role
 from app.services.phi_cleaner import redact_text
+from app.services.clinical_extractor import extract_clinical_fields
+from app.services.patient_text import seal_fields
 from app.ai.vector_store import vector_store
 from app.utils.activity_logger import log_activity
+from app.utils import executors, login_guard
 
 # Routers
 from app.routes import embedding, ai_chatbot, dashboard
@@ -58,14 +62,47 @@ app.include_router(admin_audit_router)
 # --------------------------------
 @app.on_event("startup")
 def ensure_indexes():
+    # declared + verified in app.db_indexes; never block startup on index builds
     try:
-        # speed up common audit queries
-        from app.db import audit_logs
-        audit_logs.create_index([("timestamp", -1)])
-        audit_logs.create_index([("patient_id", 1)])
-        audit_logs.create_index([("event", 1)])
+        from app.db_indexes import ensure_indexes as ensure_db_indexes
+        ensure_db_indexes()
     except Exception:
-        pass
+        logging.exception("Index setup failed")
+
+
+# --------------------------------
+# AUDIT RETENTION (archive + prune)
+# --------------------------------
+@app.on_event("startup")
+def start_audit_retention():
+    from app.utils.audit_retention import start_pruner
+    start_pruner()
+
+
+@app.on_event("shutdown")
+def stop_audit_retention():
+    from app.utils.audit_retention import stop_pruner
+    stop_pruner()
+
+
+# --------------------------------
+# BACKGROUND EMBEDDING JOBS
+# --------------------------------
+@app.on_event("startup")
+def start_embed_jobs():
+    from app.services.embed_jobs import start_workers
+    start_workers()
+
+
+@app.on_event("shutdown")
+def stop_embed_jobs():
+    from app.services.embed_jobs import stop_workers
+    stop_workers()
+
+
+@app.on_event("shutdown")
+def stop_executors():
+    executors.shutdown()
 
 # --------------------------------
 # ROOT
@@ -86,12 +123,15 @@ def upload_patient(payload: dict):
 
     patient_id = "PAT-" + str(uuid.uuid4())[:8]
 
-    patients_collection.insert_one({
+    doc = {
         "patient_id": patient_id,
         "raw_text": text,
+        "clinical": extract_clinical_fields({"raw_text": text}),
         "status": "uploaded",
         "created_at": datetime.utcnow()
-    })
+    }
+    seal_fields(doc)
+    patients_collection.insert_one(doc)
 
     # ✅ LOG ACTIVITY
     log_activity(
@@ -110,15 +150,17 @@ def upload_patient(payload: dict):
 # PHI CLEANER
 # --------------------------------
 @app.post("/clean-phi")
-def clean_phi(payload: dict):
+async def clean_phi(payload: dict):
     text = payload.get("text", "").strip()
 
     if not text:
         raise HTTPException(status_code=400, detail="Text is required")
 
-    cleaned_text = redact_text(text)
+    # CPU-bound regex work runs on the redaction process pool
+    cleaned_text = await executors.redaction.run(redact_text, text)
 
-    log_activity(
+    await run_in_threadpool(
+    log_activity,
     actor="system",
     role="system",
     action="PHI_DETECTION_COMPLETED"
@@ -138,7 +180,9 @@ def admin_health(user=Depends(require_role("admin"))):
     return {
         "status": "secure",
         "vector_store_count": len(vector_store.vectors)
-        if hasattr(vector_store, "vectors") else 0
+        if hasattr(vector_store, "vectors") else 0,
+        "executors": executors.stats(),
+        "login_guard": login_guard.stats()
     }
 
 @app.get("/admin/stats")
@@ -0,0 +1,66 @@
+# app/scripts/migrate_audit_timestamps.py
+"""Online migration: convert legacy ISO-string audit timestamps to BSON dates.
+
+Safe to run while the API is serving traffic — documents are rewritten in
+small batches by _id and each update is guarded on the timestamp still being
+a string, so concurrent writers (which now store dates) are never clobbered.
+Re-running is a no-op once every entry has been converted.
+
+    python -m app.scripts.migrate_audit_timestamps [--batch-size 500]
+"""
+import argparse
+import logging
+from pymongo import UpdateOne
+from app.db import audit_logs
+from app.utils.audit_logger import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_string_timestamps(batch_size: int = 500):
+    """Convert every string `timestamp` in audit_logs to a datetime.
+
+    Returns a dict with counts of converted and unparseable entries.
+    """
+    converted = 0
+    skipped = 0
+    last_id = None
+
+    while True:
+        query = {"timestamp": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = list(
+            audit_logs.find(query, {"timestamp": 1}).sort("_id", 1).limit(batch_size)
+        )
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            parsed = parse_timestamp(doc.get("timestamp"))
+            if parsed is None:
+                skipped += 1
+                continue
+            ops.append(UpdateOne(
+                {"_id": doc["_id"], "timestamp": {"$type": "string"}},
+                {"$set": {"timestamp": parsed}}
+            ))
+
+        if ops:
+            result = audit_logs.bulk_write(ops, ordered=False)
+            converted += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        logger.info("audit timestamp migration: %d converted, %d skipped", converted, skipped)
+
+    return {"converted": converted, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    print("✅ Migration finished:", migrate_string_timestamps(args.batch_size))
@@ -0,0 +1,36 @@
+# app/utils/pagination.py
+"""Opaque keyset-pagination tokens over a (timestamp, _id) sort position."""
+import base64
+import binascii
+import json
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from app.utils.audit_logger import iso_timestamp, parse_timestamp
+
+
+def encode_cursor(ts, oid) -> str:
+    raw = json.dumps({"ts": iso_timestamp(ts), "id": str(oid)})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token: str):
+    """Return (aware datetime, ObjectId) or raise 400 for a malformed token."""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        ts = parse_timestamp(raw["ts"])
+        oid = ObjectId(raw["id"])
+    except (ValueError, KeyError, TypeError, InvalidId, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if ts is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return ts, oid
+
+
+def seek_after(field: str, ts, oid, descending: bool = True) -> dict:
+    """Query fragment selecting rows strictly after (ts, oid) in sort order."""
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {field: {op: ts}},
+        {field: ts, "_id": {op: oid}}
+    ]}
@@ -0,0 +1,107 @@
+# app/services/patient_text.py
+"""Compressed, encrypted storage for the patient text fields.
+
+raw_text / original_text / cleaned_text are stored as zlib-compressed,
+AES-GCM envelopes (see app.services.encryption) under their usual field
+names, with the document's _id and the field name bound in as associated
+data, so an envelope copied onto another document or field fails to
+decrypt. Summary reads already project these fields away
+(PATIENT_SUMMARY_PROJECTION), so only the routes that actually need the
+text fetch and decrypt it, by calling open_fields() on what they read
+(which must include _id). Plaintext values written before this change pass
+through unchanged until app.scripts.encrypt_patient_text has converted
+them; envelopes sealed before the _id was bound still open, and the
+script's --rotate pass re-seals them.
+"""
+import zlib
+from bson import Binary, ObjectId
+from cryptography.exceptions import InvalidTag
+from app.db_indexes import PATIENT_TEXT_FIELDS
+from app.services.encryption import cipher
+
+CODEC_ZLIB = b"z"
+COMPRESS_LEVEL = 6
+
+
+def _aad(doc_id, field: str) -> bytes:
+    return f"patients.{doc_id}.{field}".encode()
+
+
+def _legacy_aad(field: str) -> bytes:
+    # envelopes sealed before the document _id was bound in
+    return f"patients.{field}".encode()
+
+
+def _decode(payload: bytes) -> str:
+    codec, body = payload[:1], payload[1:]
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(body).decode("utf-8")
+    raise ValueError(f"unknown text codec {codec!r}")
+
+
+def _decrypt(targets, field: str) -> list:
+    """[(payload, legacy)] for the sealed `field` of each doc."""
+    envelopes = [d[field] for d in targets]
+    aads = [_aad(d["_id"], field) for d in targets]
+    try:
+        return [(payload, False) for payload in cipher.decrypt_many(envelopes, aads)]
+    except InvalidTag:
+        pass
+    out = []
+    for envelope, aad in zip(envelopes, aads):
+        try:
+            out.append((cipher.decrypt(envelope, aad), False))
+        except InvalidTag:
+            out.append((cipher.decrypt(envelope, _legacy_aad(field)), True))
+    return out
+
+
+def seal_fields(*docs, ids=None) -> None:
+    """Compress and encrypt the plaintext text fields of each doc, in place.
+
+    Full documents are bound to their `_id` (one is assigned if missing, so
+    seal before insert). For `$set` dicts pass `ids`, the _id of the
+    document each one updates. The envelopes for one field across all docs
+    are produced in one encrypt_many call.
+    """
+    ids = list(ids) if ids is not None else [d.setdefault("_id", ObjectId()) for d in docs]
+    for field in PATIENT_TEXT_FIELDS:
+        targets = [(d, doc_id) for d, doc_id in zip(docs, ids) if isinstance(d.get(field), str)]
+        if not targets:
+            continue
+        payloads = [CODEC_ZLIB + zlib.compress(d[field].encode("utf-8"), COMPRESS_LEVEL) for d, _ in targets]
+        aads = [_aad(doc_id, field) for _, doc_id in targets]
+        for (d, _), envelope in zip(targets, cipher.encrypt_many(payloads, aads)):
+            d[field] = Binary(envelope)
+
+
+def open_fields(*docs) -> None:
+    """Decrypt and decompress any sealed text fields of each doc, in place."""
+    for field in PATIENT_TEXT_FIELDS:
+        targets = [d for d in docs if d and isinstance(d.get(field), bytes)]
+        if not targets:
+            continue
+        for d, (payload, _) in zip(targets, _decrypt(targets, field)):
+            d[field] = _decode(payload)
+
+
+def rotate_fields(*docs) -> list:
+    """Re-seal fields under an older key or not yet bound to their _id; returns the docs that changed.
+
+    Every sealed field is decrypted, since only that tells an unbound envelope apart.
+    """
+    changed = []
+    for field in PATIENT_TEXT_FIELDS:
+        targets = [d for d in docs if isinstance(d.get(field), bytes)]
+        if not targets:
+            continue
+        stale = [(d, payload) for d, (payload, legacy) in zip(targets, _decrypt(targets, field))
+                 if legacy or cipher.needs_rotation(d[field])]
+        if not stale:
+            continue
+        envelopes = cipher.encrypt_many([p for _, p in stale], [_aad(d["_id"], field) for d, _ in stale])
+        for (d, _), envelope in zip(stale, envelopes):
+            d[field] = Binary(envelope)
+            if not any(d is c for c in changed):
+                changed.append(d)
+    return changed
@@ -1,8 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends,HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends,HTTPException, Request, Response
 from datetime import datetime
-from app.db import patients_collection, audit_logs
+from app import db_async
+from app.ai.vector_store import vector_store
 from app.auth import require_role, require_any_role
-import re
+from app.services.ingest import ingest_upload
+from app.services.patient_text import open_fields, seal_fields
+from app.services.clinical_extractor import (
+    EXTRACTOR_VERSION,
+    SOURCE_FIELDS,
+    age_group,
+    extract_clinical_fields,
+    is_current
+)
+from app.utils import executors
+from app.utils.conditional import make_etag, not_modified, set_etag
+from app.db_indexes import PATIENT_TEXT_FIELDS, PATIENT_VERSION_PROJECTION
 
 
 router = APIRouter(prefix="/patients")
@@ -17,119 +29,119 @@ async def upload_patient_record(
     file: UploadFile = File(...),
     user=Depends(require_role("doctor"))
 ):
-    # 1️⃣ Read text file
-    text = (await file.read()).decode("utf-8")
+    # 1️⃣ Stream the text file in chunks (large bodies spill to GridFS)
+    result = await ingest_upload(file, patient_id)
 
-    # 2️⃣ Store ORIGINAL TEXT in MongoDB
-    patients_collection.insert_one({
+    # 2️⃣ Store ORIGINAL TEXT in MongoDB (with clinical fields extracted once, here)
+    doc = {
         "patient_id": patient_id,
-        "raw_text": text,
+        "clinical": await executors.redaction.run(extract_clinical_fields, {"raw_text": result["text"] or result["head"]}),
         "uploaded_by": user["username"],
         "status": "uploaded",
         "created_at": datetime.utcnow()
-    })
-
-    print("🟢 INSERTING PATIENT:", patient_id)
+    }
+    if result["file_id"] is not None:
+        doc.update(
+            text_file_id=result["file_id"],
+            text_encoding=result["encoding"],
+            text_size=result["size"]
+        )
+    else:
+        doc["raw_text"] = result["text"]
+    seal_fields(doc)
+
+    await db_async.patients_collection.insert_one(doc)
 
     return {
         "message": "Patient record uploaded",
         "patient_id": patient_id
     }
 
+async def _refresh_clinical(doc_id):
+    """Re-run extraction for a document written before (or by an older) extractor."""
+    source = await db_async.patients_collection.find_one({"_id": doc_id}, {f: 1 for f in SOURCE_FIELDS}) or {}
+    open_fields(source)
+    clinical = await executors.redaction.run(extract_clinical_fields, source)
+    await db_async.patients_collection.update_one({"_id": doc_id}, {"$set": {"clinical": clinical}})
+    return clinical
+
+
 # ---------------------------
 # GET LATEST PATIENT
 # ---------------------------
 @router.get("/latest")
-def get_latest_patient(limit: int = 1, user=Depends(require_any_role("doctor", "nurse"))):
+async def get_latest_patient(request: Request, response: Response, limit: int = 1, user=Depends(require_any_role("doctor", "nurse"))):
     """Return the latest embedded patient record(s) (default 1). The response is
     sanitized to remove PHI and enriched with non-PHI clinical fields that the
     frontend expects (case_id, age_group, primary_diagnosis, medications,
     timeline). Vector metadata is preferred when available (non-PHI fields like
     age, bp, past_history) with MongoDB as a fallback.
+
+    Responses carry an ETag derived from the ids/vector ids of the selected
+    records; a matching If-None-Match returns 304 before any enrichment.
     """
-    cursor = patients_collection.find(
+    # index-only probe (status, created_at, vector_id)
+    versions = await db_async.patients_collection.find(
         {"status": "embedded"},
+        PATIENT_VERSION_PROJECTION,
         sort=[("created_at", -1)]
-    ).limit(limit)
+    ).limit(limit).to_list(limit)
+    etag = make_etag(limit, EXTRACTOR_VERSION, versions)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    set_etag(response, etag)
+
+    # clinical fields are precomputed at upload/embed time; never load the PHI text here
+    patients = await db_async.patients_collection.find(
+        {"status": "embedded"},
+        {"_id": 1, "patient_id": 1, "vector_id": 1, "created_at": 1, "clinical": 1},
+        sort=[("created_at", -1)]
+    ).limit(limit).to_list(limit)
+    pids = [p.get("patient_id") for p in patients]
+
+    # one aggregation for every patient's latest embed timestamp (no per-patient find_one)
+    embedded_at = {}
+    try:
+        for row in await db_async.audit_logs.aggregate([
+            {"$match": {"patient_id": {"$in": pids}, "event": "VECTOR_EMBEDDED"}},
+            {"$sort": {"timestamp": -1}},
+            {"$group": {"_id": "$patient_id", "timestamp": {"$first": "$timestamp"}}}
+        ]).to_list(None):
+            embedded_at[row["_id"]] = row["timestamp"]
+    except Exception:
+        embedded_at = {}
+
+    # one grouped lookup of each patient's current vector (by the vector_id on the doc)
+    try:
+        vectors = vector_store.get_many([p.get("vector_id") for p in patients if p.get("vector_id")])
+    except Exception:
+        vectors = {}
 
     results = []
 
-    for patient in cursor:
+    for patient in patients:
         pid = patient.get("patient_id")
 
-        # map id
-        patient["_id"] = str(patient["_id"])
-
-        # remove PHI
-        for phi_field in ("raw_text", "original_text", "patient_name", "cleaned_text"):
-            patient.pop(phi_field, None)
+        clinical = patient.get("clinical")
+        if not is_current(clinical):
+            clinical = await _refresh_clinical(patient["_id"])
 
         # build non-PHI case fields
         case = {
             "case_id": patient.get("vector_id") or patient.get("patient_id"),
             "patient_id": patient.get("patient_id"),
             "created_at": patient.get("created_at"),
+            "current_bp": clinical.get("bp"),
+            "past_history": clinical.get("past_history"),
+            "primary_diagnosis": clinical.get("primary_diagnosis"),
+            "medications": clinical.get("medications") or [],
+            "risk_level": clinical.get("risk_level") or "low",
         }
-
-        # age (numeric) + age_group (prefer vector metadata later)
-        age = patient.get("age")
-        if age is not None:
-            case["age"] = age
-            if isinstance(age, int):
-                if age < 18:
-                    case["age_group"] = "pediatric"
-                elif age >= 65:
-                    case["age_group"] = "senior"
-                else:
-                    case["age_group"] = "adult"
-
-        # Extract BP and Past Medical History from available text fields (Mongo fallback)
-        text_fields = " ".join(str(patient.get(k, "")) for k in ("original_text", "raw_text", "cleaned_text", "chief_complaint", "notes"))
-
-        # current BP (if present in mongo doc)
-        bp_match = re.search(r"\b(?:BP|Blood Pressure)[: ]+\s*(\d{2,3}/\d{2,3})", text_fields, re.IGNORECASE)
-        if bp_match:
-            case["current_bp"] = bp_match.group(1)
-        else:
-            case["current_bp"] = None
-
-        # past medical history (simple capture)
-        ph_match = re.search(r"Past Medical History:\s*(.+?)(?:\n|$)", text_fields, re.IGNORECASE)
-        if ph_match:
-            case["past_history"] = ph_match.group(1).strip()
-        else:
-            # fallback to metadata stored in patient notes
-            case["past_history"] = patient.get("past_history") or patient.get("notes") or None
-
-        # primary diagnosis (best-effort heuristic)
-        text = patient.get("chief_complaint") or ""
-        # look for a Diagnosis field in metadata if available
-        diag = None
-        if "diagnosis" in patient:
-            diag = patient.get("diagnosis")
-        else:
-            m = re.search(r"Primary Diagnosis:\s*(.+)", text, re.IGNORECASE)
-            if m:
-                diag = m.group(1).strip()
-        case["primary_diagnosis"] = diag
-
-        # medications (heuristic: look for 'mg' or 'dose' in available text fields)
-        meds = []
-        search_text = ""
-        # try to use cleaned_text stored under a different key (safe) if present in doc metadata
-        if patient.get("notes"):
-            search_text = patient.get("notes")
-        # fallback: try any remaining short fields
-        if not search_text:
-            search_text = " ".join(str(patient.get(k, "")) for k in ["chief_complaint"]) or ""
-
-        for line in re.split(r"[\n\r]+", search_text):
-            if re.search(r"\b\d+\s*mg\b|\bDose\b|\bdose\b|once daily|twice daily|tablet", line, re.IGNORECASE):
-                # very small parser: name then dosage
-                name = line.strip()
-                meds.append({"name": name, "dose": "", "frequency": ""})
-
-        case["medications"] = meds
+        if clinical.get("age") is not None:
+            case["age"] = clinical.get("age")
+            if clinical.get("age_group"):
+                case["age_group"] = clinical.get("age_group")
 
         # timeline: include upload and embedding event
         timeline = []
@@ -139,57 +151,30 @@ def get_latest_patient(limit: int = 1, user=Depends(require_any_role("doctor", "
                 "event": "Clinical record uploaded & de-identified"
             })
 
-        # find embed audit log for nicer message
-        embed_log = None
-        try:
-            embed_log = audit_logs.find_one({"patient_id": pid, "event": "VECTOR_EMBEDDED"}, sort=[("timestamp", -1)])
-        except Exception:
-            embed_log = None
-
-        if embed_log and embed_log.get("timestamp"):
+        if embedded_at.get(pid):
             timeline.append({
-                "date": embed_log.get("timestamp"),
+                "date": embedded_at[pid],
                 "event": "Indexing completed (vector embedded)"
             })
 
         case["timeline"] = timeline
 
-        # risk_level simple heuristic
-        risk = "low"
-        txt_for_risk = search_text.lower()
-        if any(k in txt_for_risk for k in ("critical", "icu", "unstable", "hemodynamic")):
-            risk = "high"
-        elif any(k in txt_for_risk for k in ("watch", "monitor", "concern")):
-            risk = "medium"
-        case["risk_level"] = risk
-
         # --- Prefer vector metadata when available ---
-        try:
-            vecs = vector_store.search(pid, top_k=1)
-            if vecs:
-                vmeta = vecs[0].get("metadata", {})
-                # prefer non-PHI numeric age from vector metadata
-                if vmeta.get("age") is not None:
-                    case["age"] = vmeta.get("age")
-                    # recompute age_group if numeric
-                    try:
-                        a = int(vmeta.get("age"))
-                        if a < 18:
-                            case["age_group"] = "pediatric"
-                        elif a >= 65:
-                            case["age_group"] = "senior"
-                        else:
-                            case["age_group"] = "adult"
-                    except Exception:
-                        pass
-
-                if vmeta.get("bp"):
-                    case["current_bp"] = vmeta.get("bp")
-                if vmeta.get("past_history"):
-                    case["past_history"] = vmeta.get("past_history")
-        except Exception:
-            # if vector store unavailable, silently continue with Mongo values
-            pass
+        vec = vectors.get(patient.get("vector_id"))
+        if vec:
+            vmeta = vec.get("metadata", {})
+            # prefer non-PHI numeric age from vector metadata
+            if vmeta.get("age") is not None:
+                case["age"] = vmeta.get("age")
+                # recompute age_group if numeric
+                group = age_group(vmeta.get("age"))
+                if group:
+                    case["age_group"] = group
+
+            if vmeta.get("bp"):
+                case["current_bp"] = vmeta.get("bp")
+            if vmeta.get("past_history"):
+                case["past_history"] = vmeta.get("past_history")
 
         # merge sanitized patient fields and case
         patient_response = {**case}
@@ -206,11 +191,15 @@ def get_latest_patient(limit: int = 1, user=Depends(require_any_role("doctor", "
 
 
 @router.get("/latest/debug")
-def get_latest_patient_debug(user=Depends(require_role("doctor"))):
+async def get_latest_patient_debug(user=Depends(require_role("doctor"))):
     """Return the latest embedded patient and both data sources (Mongo doc and vector metadata)
     for debugging. This endpoint is protected by `doctor` role.
     """
-    patient = patients_collection.find_one({"status": "embedded"}, sort=[("created_at", -1)])
+    patient = await db_async.patients_collection.find_one(
+        {"status": "embedded"},
+        {f: 0 for f in PATIENT_TEXT_FIELDS},
+        sort=[("created_at", -1)]
+    )
     if not patient:
         raise HTTPException(status_code=404, detail="No embedded patient found")
 
@@ -219,6 +208,8 @@ def get_latest_patient_debug(user=Depends(require_role("doctor"))):
     # sanitize patient doc (remove PHI)
     sanitized = {k: v for k, v in patient.items() if k not in ("raw_text", "original_text", "patient_name", "cleaned_text")}
     sanitized["_id"] = str(sanitized.get("_id"))
+    if sanitized.get("text_file_id") is not None:
+        sanitized["text_file_id"] = str(sanitized["text_file_id"])
 
     vec_meta = None
     try:
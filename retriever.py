@@ -1,5 +1,6 @@
 from app.ai.vector_store import vector_store
 from app.db import patients_collection
+from app.services.patient_text import open_fields
 
 def retrieve_patient_docs(patient_id: str, question: str, top_k: int = 3):
     """
@@ -24,8 +25,13 @@ def retrieve_patient_docs(patient_id: str, question: str, top_k: int = 3):
     # If no vectors found, fall back to the patient's latest embedded/cleaned text
     if not docs:
         try:
-            patient = patients_collection.find_one({"patient_id": patient_id})
+            patient = patients_collection.find_one(
+                {"patient_id": patient_id},
+                {"cleaned_text": 1, "raw_text": 1, "original_text": 1},
+                sort=[("created_at", -1)]
+            )
             if patient:
+                open_fields(patient)
                 text = patient.get("cleaned_text") or patient.get("raw_text") or patient.get("original_text")
                 if text:
                     docs.append({"text": text, "source": patient_id, "score": None})
@@ -0,0 +1,90 @@
+# tests/test_audit_retention.py
+"""Archive-then-prune of expired audit entries (app.utils.audit_retention)."""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.utils import audit_retention
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+class _Cursor(list):
+    def sort(self, keys):
+        return _Cursor(sorted(self, key=lambda e: tuple(e[k] for k, _ in keys)))
+
+    def limit(self, n):
+        return _Cursor(self[:n])
+
+
+class _AuditLogs:
+    """Just enough of a collection for archive_and_prune."""
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+
+    def find(self, query):
+        cutoff = query["timestamp"]["$lt"]
+        return _Cursor(e for e in self.entries if e["timestamp"] < cutoff)
+
+    def delete_many(self, query):
+        ids = set(query["_id"]["$in"])
+        self.entries = [e for e in self.entries if e["_id"] not in ids]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    settings = MagicMock()
+    settings.find_one.return_value = {"audit_log_retention": "30 days"}
+    logs = _AuditLogs(
+        {"_id": ObjectId(), "event": "LOGIN", "actor": f"user{i}", "timestamp": NOW - timedelta(days=d)}
+        for i, d in enumerate([45, 40, 39, 31, 10, 1])
+    )
+    monkeypatch.setattr(audit_retention, "settings_collection", settings)
+    monkeypatch.setattr(audit_retention, "audit_logs", logs)
+    monkeypatch.setattr(audit_retention, "AUDIT_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(audit_retention, "PRUNE_BATCH_SIZE", 2)
+    return settings, logs
+
+
+def test_expired_entries_are_archived_then_pruned(store):
+    _, logs = store
+    result = audit_retention.archive_and_prune(NOW)
+
+    assert result["archived"] == 4
+    assert [e["actor"] for e in logs.entries] == ["user4", "user5"]
+    archived = list(audit_retention.iter_archived({}))
+    # newest first, as the export expects
+    assert [e["actor"] for e in archived] == ["user3", "user2", "user1", "user0"]
+    assert [e["actor"] for e in audit_retention.iter_archived({"actor": "user1"})] == ["user1"]
+
+
+def test_run_stops_when_the_lease_is_lost(store):
+    _, logs = store
+    renewals = iter([True, False])
+    result = audit_retention.archive_and_prune(NOW, lease=lambda: next(renewals))
+
+    assert result["archived"] == 2
+    assert len(logs.entries) == 4
+
+
+def test_lease_is_refused_while_another_worker_holds_it(store):
+    settings, _ = store
+    assert audit_retention.acquire_lease("worker-a")
+    query, update = settings.find_one_and_update.call_args[0]
+    assert query["_id"] == audit_retention.LEASE_ID
+    assert {"owner": "worker-a"} in query["$or"]
+    assert update["$set"]["owner"] == "worker-a"
+
+    # the upsert collides with the live lease document
+    settings.find_one_and_update.side_effect = DuplicateKeyError("E11000")
+    assert not audit_retention.acquire_lease("worker-b")
+
+
+def test_release_only_drops_our_own_lease(store):
+    settings, _ = store
+    audit_retention.release_lease("worker-a")
+    settings.delete_one.assert_called_once_with({"_id": audit_retention.LEASE_ID, "owner": "worker-a"})
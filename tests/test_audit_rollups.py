@@ -0,0 +1,68 @@
+# tests/test_audit_rollups.py
+"""Hourly audit counters (app.utils.audit_rollups)."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.utils import audit_rollups
+
+
+class _Rollups:
+    """In-memory `audit_rollups` supporting the $inc upsert and _id range reads."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"]})
+        for path, n in update["$inc"].items():
+            *parents, leaf = path.split(".")
+            target = doc
+            for p in parents:
+                target = target.setdefault(p, {})
+            target[leaf] = target.get(leaf, 0) + n
+
+    def find(self, query):
+        since = query.get("_id", {}).get("$gte")
+        return [d for d in self.docs.values() if since is None or d["_id"] >= since]
+
+
+@pytest.fixture
+def rollups(monkeypatch):
+    rollups = _Rollups()
+    monkeypatch.setattr(audit_rollups, "audit_rollups", rollups)
+    return rollups
+
+
+def _entry(event, minutes, **detail):
+    ts = datetime(2024, 5, 1, 9, tzinfo=timezone.utc) + timedelta(minutes=minutes)
+    return {"event": event, "timestamp": ts, "detail": detail}
+
+
+def test_entries_are_counted_per_hour(rollups):
+    audit_rollups.record(_entry("LOGIN", 5, status="success"))
+    audit_rollups.record(_entry("LOGIN", 50, status="Error"))
+    audit_rollups.record(_entry("AI_ASK", 70, action="ask.v2"))
+
+    assert sorted(rollups.docs) == [datetime(2024, 5, 1, 9), datetime(2024, 5, 1, 10)]
+    assert audit_rollups.read_totals() == {
+        "total": 3,
+        "events": {"LOGIN": 2, "AI_ASK": 1},
+        "status": {"success": 1, "failed": 1},
+        # '.' is escaped in the stored field name and restored on read
+        "actions": {"ask.v2": 1},
+    }
+
+
+def test_totals_since_start_at_the_containing_hour(rollups):
+    audit_rollups.record(_entry("LOGIN", 5))
+    audit_rollups.record(_entry("LOGIN", 65))
+    since = datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc)
+    assert audit_rollups.read_totals(since)["total"] == 1
+
+
+def test_field_names_round_trip():
+    for name in ("a.b", "$set", "100%", "%2E"):
+        key = audit_rollups._key(name)
+        assert "." not in key and not key.startswith("$")
+        assert audit_rollups._unkey(key) == name
@@ -0,0 +1,48 @@
+# tests/test_audit_search.py
+"""Trigram prefilter for audit search (app.utils.audit_search)."""
+from app.utils.audit_search import MAX_FIELD_CHARS, search_fields, search_grams, search_query
+
+ENTRY = {
+    "event": "PATIENT_VIEWED",
+    "actor": "Dr.Smith",
+    "role": "doctor",
+    "detail": {"action": "VIEW_RECORD", "note": "checked BP trend"},
+}
+
+
+def _gram_filter(query):
+    return query["$and"][0]["$or"][0]["search_grams"]["$all"]
+
+
+def test_grams_cover_every_searchable_substring():
+    grams = set(search_grams(ENTRY))
+    for q in ("smith", "DR.S", "view_rec", "bp tre", "patient"):
+        assert set(_gram_filter(search_query(q))) <= grams
+
+
+def test_unrelated_text_is_filtered_out():
+    assert not set(_gram_filter(search_query("nurse"))) <= set(search_grams(ENTRY))
+
+
+def test_short_queries_skip_the_gram_index():
+    query = search_query("bp")
+    assert "$and" not in query
+    assert {"detail.note": {"$regex": "bp", "$options": "i"}} in query["$or"]
+
+
+def test_query_text_is_escaped():
+    query = search_query("a.b*c")
+    assert query["$and"][1]["$or"][0] == {"event": {"$regex": r"a\.b\*c", "$options": "i"}}
+
+
+def test_long_fields_are_capped_and_flagged():
+    note = "x" * MAX_FIELD_CHARS + " needle"
+    fields = search_fields({**ENTRY, "detail": {"note": note}})
+    assert fields["search_grams_partial"] is True
+    assert "nee" not in fields["search_grams"]
+    # partial entries stay candidates whatever their grams
+    assert {"search_grams_partial": True} in search_query("needle")["$and"][0]["$or"]
+
+
+def test_short_fields_are_not_flagged():
+    assert "search_grams_partial" not in search_fields(ENTRY)
@@ -0,0 +1,35 @@
+# tests/test_audit_timestamps.py
+"""Audit timestamp coercion (app.utils.audit_logger)."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.utils.audit_logger import iso_timestamp, parse_timestamp
+
+UTC_NOON = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2024, 5, 1, 12),
+    UTC_NOON,
+    datetime(2024, 5, 1, 17, 30, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+    "2024-05-01T12:00:00Z",
+    "2024-05-01T12:00:00+00:00",
+    "2024-05-01T12:00:00",
+])
+def test_values_become_aware_utc(value):
+    parsed = parse_timestamp(value)
+    assert parsed == UTC_NOON
+    assert parsed.utcoffset() == timedelta(0)
+
+
+@pytest.mark.parametrize("value", [None, "", "yesterday", 1714564800])
+def test_unparseable_values(value):
+    assert parse_timestamp(value) is None
+
+
+def test_iso_timestamp_for_responses():
+    assert iso_timestamp(datetime(2024, 5, 1, 12)) == "2024-05-01T12:00:00+00:00"
+    # legacy free-form strings are passed through rather than dropped
+    assert iso_timestamp("last week") == "last week"
+    assert iso_timestamp(None) is None
@@ -0,0 +1,66 @@
+# tests/test_auth_cache.py
+"""Cached token claims and user records (app.auth)."""
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import HTTPException
+
+from app import auth
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    jwt = MagicMock()
+    jwt.decode.side_effect = lambda token, key, algorithms: {
+        "sub": "nurse1", "role": token, "exp": time.time() + 600}
+    users = MagicMock()
+    users.find_one = AsyncMock(return_value={"username": "nurse1", "ward": "B"})
+    monkeypatch.setattr(auth, "jwt", jwt)
+    monkeypatch.setattr(auth.db_async, "users_collection", users)
+    monkeypatch.setattr(auth, "_claims_cache", auth.TTLCache())
+    monkeypatch.setattr(auth, "_user_cache", auth.TTLCache())
+    return jwt, users
+
+
+def test_repeat_requests_skip_decoding_and_the_user_lookup(backend):
+    jwt, users = backend
+    for _ in range(3):
+        user = asyncio.run(auth.user_from_token("nurse"))
+    assert user == {"username": "nurse1", "ward": "B", "role": "nurse"}
+    assert jwt.decode.call_count == 1
+    assert users.find_one.await_count == 1
+
+
+def test_role_comes_from_each_token_not_the_cached_user(backend):
+    assert asyncio.run(auth.user_from_token("nurse"))["role"] == "nurse"
+    assert asyncio.run(auth.user_from_token("doctor"))["role"] == "doctor"
+    assert "role" not in auth._user_cache.get("nurse1")
+
+
+def test_expired_claims_are_decoded_again(backend):
+    jwt, _ = backend
+    auth._decode_claims("nurse")
+    key = next(iter(auth._claims_cache._data))
+    auth._claims_cache.set(key, {"sub": "nurse1", "exp": time.time() - 1})
+    auth._decode_claims("nurse")
+    assert jwt.decode.call_count == 2
+
+
+def test_invalid_token_is_rejected_and_not_cached(backend):
+    jwt, _ = backend
+    jwt.decode.side_effect = auth.JWTError("bad signature")
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            auth._decode_claims("forged")
+        assert exc.value.status_code == 401
+    assert jwt.decode.call_count == 2
+
+
+def test_invalidate_user_forces_a_fresh_read(backend):
+    _, users = backend
+    asyncio.run(auth.user_from_token("nurse"))
+    auth.invalidate_user("nurse1")
+    asyncio.run(auth.user_from_token("nurse"))
+    assert users.find_one.await_count == 2
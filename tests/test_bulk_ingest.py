@@ -0,0 +1,47 @@
+# tests/test_bulk_ingest.py
+"""Sources, patient ids and checkpoints of the bulk ingest command (app.scripts.bulk_ingest)."""
+import zipfile
+
+from app.scripts import bulk_ingest
+
+NOTE = b"Patient Name: Jane Roe\nAge: 47\nGender: Female\nChief Complaint: cough\n"
+
+
+def test_patient_id_keeps_same_named_files_apart():
+    assert bulk_ingest._patient_id("123.txt") == "123"
+    assert bulk_ingest._patient_id("clinic_a/123.txt") == "clinic_a-123"
+    assert bulk_ingest._patient_id("clinic_b/123.txt") == "clinic_b-123"
+
+
+def test_directory_and_zip_sources_yield_the_same_keys(tmp_path):
+    notes = tmp_path / "notes"
+    (notes / "clinic_a").mkdir(parents=True)
+    (notes / "clinic_a" / "1.txt").write_bytes(NOTE)
+    (notes / "2.txt").write_bytes(NOTE)
+    (notes / "scan.pdf").write_bytes(b"%PDF")
+
+    archive = tmp_path / "notes.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("clinic_a/1.txt", NOTE)
+        zf.writestr("2.txt", NOTE)
+        zf.writestr("scan.pdf", b"%PDF")
+
+    from_dir = {key: load() for key, load in bulk_ingest.iter_sources(notes)}
+    from_zip = {key: load() for key, load in bulk_ingest.iter_sources(archive)}
+    assert from_dir == from_zip == {"2.txt": NOTE, "clinic_a/1.txt": NOTE}
+
+
+def test_read_note_extracts_the_dashboard_fields():
+    doc = bulk_ingest._read_note("clinic_a/1.txt", lambda: NOTE)
+    assert doc["patient_id"] == "clinic_a-1"
+    assert doc["source"] == "clinic_a/1.txt"
+    assert doc["age"] == 47
+    assert doc["raw_text"] == NOTE.decode()
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = tmp_path / "ingest.ckpt"
+    assert bulk_ingest.load_checkpoint(checkpoint) == set()
+    bulk_ingest._append_checkpoint(checkpoint, ["a.txt", "b/c.txt"])
+    bulk_ingest._append_checkpoint(checkpoint, ["d.txt"])
+    assert bulk_ingest.load_checkpoint(checkpoint) == {"a.txt", "b/c.txt", "d.txt"}
@@ -0,0 +1,116 @@
+# tests/test_cache.py
+"""TTLCache expiry, eviction and single-flight fills (app.utils.cache)."""
+import asyncio
+import threading
+import time
+
+from app.utils.cache import TTLCache
+
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.05)
+    cache.set("k", 1)
+    assert cache.get("k") == 1
+    time.sleep(0.06)
+    assert cache.get("k", "gone") == "gone"
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_get_or_set_is_single_flight():
+    cache = TTLCache()
+    calls = []
+    gate = threading.Event()
+
+    def factory():
+        calls.append(1)
+        gate.wait(1)
+        return "stats"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set("k", factory))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == ["stats"] * 8
+
+
+def test_get_or_set_does_not_cache_failures():
+    cache = TTLCache()
+
+    def boom():
+        raise RuntimeError("backend down")
+
+    try:
+        cache.get_or_set("k", boom)
+    except RuntimeError:
+        pass
+    assert cache.get_or_set("k", lambda: "ok") == "ok"
+
+
+def test_aget_or_set_shares_one_task():
+    cache = TTLCache()
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_set("k", factory) for _ in range(8)))
+
+    assert asyncio.run(main()) == ["answer"] * 8
+    assert len(calls) == 1
+    assert cache.get("k") == "answer"
+
+
+def test_aget_or_set_survives_a_cancelled_awaiter():
+    cache = TTLCache()
+
+    async def factory():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(cache.aget_or_set("k", factory))
+        second = asyncio.ensure_future(cache.aget_or_set("k", factory))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "answer"
+    assert cache.get("k") == "answer"
+
+
+def test_aget_or_set_does_not_cache_failures():
+    cache = TTLCache()
+
+    async def boom():
+        raise RuntimeError("llm down")
+
+    async def ok():
+        return "answer"
+
+    async def main():
+        try:
+            await cache.aget_or_set("k", boom)
+        except RuntimeError:
+            pass
+        return await cache.aget_or_set("k", ok)
+
+    assert asyncio.run(main()) == "answer"
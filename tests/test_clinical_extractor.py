@@ -0,0 +1,53 @@
+# tests/test_clinical_extractor.py
+"""Stored clinical field extraction (app.services.clinical_extractor)."""
+from app.services.clinical_extractor import (
+    EXTRACTOR_VERSION,
+    extract_clinical_fields,
+    is_current,
+    vector_metadata,
+)
+
+NOTE = (
+    "Patient Name: Jane Roe\n"
+    "BP: 142/91\n"
+    "Past Medical History: Hypertension since 2015\n"
+    "Primary Diagnosis: should not be read from the note\n"
+    "Metformin 500 mg twice daily\n"
+    "Patient is critical\n"
+)
+
+
+def test_fields_from_the_note_and_the_record():
+    clinical = extract_clinical_fields({
+        "age": 70,
+        "raw_text": NOTE,
+        "chief_complaint": "Primary Diagnosis: Pneumonia",
+        "notes": "Amoxicillin 500 mg tablet\nmonitor overnight",
+    })
+    assert clinical["age_group"] == "senior"
+    assert clinical["bp"] == "142/91"
+    assert clinical["past_history"] == "Hypertension since 2015"
+    assert clinical["primary_diagnosis"] == "Pneumonia"
+    # medications and risk come from the short clinical fields, not the full note
+    assert [m["name"] for m in clinical["medications"]] == ["Amoxicillin 500 mg tablet"]
+    assert clinical["risk_level"] == "medium"
+
+
+def test_stored_diagnosis_wins_even_when_empty():
+    clinical = extract_clinical_fields({"diagnosis": None, "chief_complaint": "Primary Diagnosis: Flu"})
+    assert clinical["primary_diagnosis"] is None
+
+
+def test_chief_complaint_is_used_without_notes():
+    clinical = extract_clinical_fields({"chief_complaint": "unstable, Lisinopril 10 mg"})
+    assert clinical["risk_level"] == "high"
+    assert len(clinical["medications"]) == 1
+
+
+def test_version_stamp_and_vector_metadata():
+    clinical = extract_clinical_fields({"age": "12", "raw_text": "asthma flare"})
+    assert clinical["extractor_version"] == EXTRACTOR_VERSION
+    assert is_current(clinical)
+    assert not is_current({**clinical, "extractor_version": EXTRACTOR_VERSION - 1})
+    assert not is_current(None)
+    assert vector_metadata(clinical) == {"age": "12", "past_history": "asthma"}
@@ -0,0 +1,44 @@
+# tests/test_conditional.py
+"""ETag / If-None-Match handling for polled reads (app.utils.conditional)."""
+from fastapi import Request, Response
+
+from app.utils.conditional import CACHE_CONTROL, make_etag, not_modified, set_etag
+
+
+def _request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_is_weak_and_depends_only_on_the_parts():
+    etag = make_etag("P-1", {"b": 2, "a": 1})
+    assert etag.startswith('W/"')
+    assert etag == make_etag("P-1", {"a": 1, "b": 2})
+    assert etag != make_etag("P-2", {"a": 1, "b": 2})
+
+
+def test_matching_if_none_match_returns_304():
+    etag = make_etag("v1")
+    response = not_modified(_request(etag), etag)
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == CACHE_CONTROL
+
+
+def test_any_listed_etag_or_star_matches():
+    etag = make_etag("v1")
+    assert not_modified(_request(f'W/"old", {etag}'), etag).status_code == 304
+    assert not_modified(_request("*"), etag).status_code == 304
+
+
+def test_stale_or_missing_if_none_match_falls_through():
+    etag = make_etag("v2")
+    assert not_modified(_request(make_etag("v1")), etag) is None
+    assert not_modified(_request(), etag) is None
+
+
+def test_set_etag_marks_the_response_for_revalidation():
+    response = Response()
+    set_etag(response, make_etag("v1"))
+    assert response.headers["etag"] == make_etag("v1")
+    assert response.headers["cache-control"] == CACHE_CONTROL
@@ -0,0 +1,152 @@
+# tests/test_embed_jobs.py
+"""SQLite-backed embedding job queue (app.services.embed_jobs)."""
+import sys
+import threading
+import types
+from unittest.mock import MagicMock
+
+import pytest
+from bson import ObjectId
+
+from app.services import embed_jobs
+
+USER = {"username": "admin1", "role": "admin"}
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(embed_jobs, "EMBED_JOBS_DB", str(tmp_path / "jobs.db"))
+    patients = MagicMock()
+    monkeypatch.setattr(embed_jobs, "patients_collection", patients)
+    embed_jobs.init_db()
+    return patients
+
+
+def _submit(patients, patient_ids, kind="embed"):
+    patients.aggregate.return_value = [
+        {"_id": pid, "doc": {"_id": ObjectId(), "patient_id": pid}} for pid in patient_ids
+    ]
+    return embed_jobs.submit(kind, patient_ids, USER)
+
+
+def test_submit_queues_one_item_per_patient(queue):
+    job = _submit(queue, ["P-1", "P-2", "P-3"])
+    assert job["status"] == "queued"
+    assert (job["total"], job["queued"]) == (3, 3)
+    (query, update), _ = queue.update_many.call_args
+    assert len(query["_id"]["$in"]) == 3
+    assert update == {"$set": {"status": "queued"}}
+
+
+def test_refresh_leaves_patient_status_alone(queue):
+    _submit(queue, ["P-1"], kind="refresh")
+    queue.update_many.assert_not_called()
+
+
+def test_submit_rejects_unknown_kind_and_missing_patients(queue):
+    with pytest.raises(ValueError):
+        embed_jobs.submit("delete", ["P-1"], USER)
+    queue.aggregate.return_value = []
+    with pytest.raises(LookupError):
+        embed_jobs.submit("embed", ["P-404"], USER)
+
+
+def test_concurrent_claims_never_overlap(queue):
+    _submit(queue, [f"P-{i}" for i in range(60)])
+    claimed, lock = [], threading.Lock()
+
+    def worker():
+        while True:
+            items = embed_jobs._claim(7)
+            if not items:
+                return
+            with lock:
+                claimed.extend((i["job_id"], i["patient_id"]) for i in items)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(claimed) == 60
+    assert len(set(claimed)) == 60
+
+
+def test_claimed_items_carry_the_job_and_show_as_running(queue):
+    job = _submit(queue, ["P-1", "P-2"])
+    items = embed_jobs._claim(1)
+    assert [(i["kind"], i["submitted_by"], i["role"]) for i in items] == [("embed", "admin1", "admin")]
+    progress = embed_jobs.get_job(job["job_id"])
+    assert (progress["status"], progress["embedding"], progress["queued"]) == ("running", 1, 1)
+
+
+def test_failed_batch_still_finishes_every_item(queue, monkeypatch):
+    job = _submit(queue, ["P-1", "P-2", "P-3"])
+    items = embed_jobs._claim(10)
+
+    def half_done(items, results):
+        results.append((items[0], "embedded", "vec-1", None))
+        raise RuntimeError("vector store unavailable")
+
+    monkeypatch.setattr(embed_jobs, "_embed_batch", half_done)
+    queue.update_many.reset_mock()
+    with pytest.raises(RuntimeError):
+        embed_jobs.process_batch(items)
+
+    progress = embed_jobs.get_job(job["job_id"], include_failures=True)
+    assert progress["status"] == "completed_with_errors"
+    assert (progress["embedded"], progress["failed"]) == (1, 2)
+    assert {f["error"] for f in progress["failures"]} == {"vector store unavailable"}
+    (query, update), _ = queue.update_many.call_args
+    assert len(query["_id"]["$in"]) == 2
+    assert update == {"$set": {"status": "embed_failed"}}
+
+
+def test_interrupted_items_are_requeued_on_start(queue, monkeypatch):
+    monkeypatch.setattr(embed_jobs, "EMBED_JOB_WORKERS", 0)
+    job = _submit(queue, ["P-1", "P-2"])
+    embed_jobs._claim(10)
+    embed_jobs.start_workers()
+    assert embed_jobs.get_job(job["job_id"])["queued"] == 2
+
+
+class _Vectors:
+    """Stands in for the in-memory VectorStore (no model load)."""
+
+    def __init__(self, fresh):
+        self.fresh = fresh
+        self.stored = []
+
+    def is_fresh(self, vector_id, fp):
+        return self.fresh.get(vector_id) == fp
+
+    def store_many(self, items, batch_size=32):
+        self.stored.extend(items)
+        return [f"vec-new-{pid}" for pid, _, _ in items]
+
+
+def test_refresh_skips_unchanged_records(queue, monkeypatch):
+    vectors = _Vectors({"vec-1": "fp:same text", "vec-2": "fp:old text"})
+    monkeypatch.setitem(sys.modules, "app.ai.vector_store", types.SimpleNamespace(
+        fingerprint=lambda text: f"fp:{text}", vector_store=vectors))
+    monkeypatch.setattr("app.utils.audit_logger.log_audit", lambda **kw: None)
+
+    job = _submit(queue, ["P-1", "P-2", "P-3"], kind="refresh")
+    items = embed_jobs._claim(10)
+    docs = {i["patient_id"]: ObjectId(i["doc_id"]) for i in items}
+    queue.find.return_value = [
+        # unchanged text with a live vector: skipped
+        {"_id": docs["P-1"], "cleaned_text": "same text", "vector_id": "vec-1", "vector_fingerprint": "fp:same text"},
+        # text edited since it was embedded: re-encoded
+        {"_id": docs["P-2"], "cleaned_text": "new text", "vector_id": "vec-2", "vector_fingerprint": "fp:old text"},
+        # fingerprint matches but the vector is gone: re-encoded
+        {"_id": docs["P-3"], "cleaned_text": "kept", "vector_id": "vec-3", "vector_fingerprint": "fp:kept"},
+    ]
+
+    assert embed_jobs.process_batch(items) == 2
+    assert sorted(pid for pid, _, _ in vectors.stored) == ["P-2", "P-3"]
+    progress = embed_jobs.get_job(job["job_id"])
+    assert (progress["status"], progress["embedded"], progress["skipped"]) == ("completed", 2, 1)
+    # refresh items never reset the patient status of skipped records
+    queue.update_many.assert_not_called()
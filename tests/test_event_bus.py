@@ -0,0 +1,55 @@
+# tests/test_event_bus.py
+"""In-process pub/sub behind the dashboard SSE stream (app.utils.event_bus)."""
+import asyncio
+import threading
+
+from app.utils import event_bus
+
+
+def test_publish_from_a_worker_thread_reaches_matching_subscribers():
+    async def main():
+        audit = event_bus.subscribe({"audit"})
+        everything = event_bus.subscribe()
+        try:
+            t = threading.Thread(target=event_bus.publish, args=("audit", {"actor": "nurse1"}))
+            t.start()
+            t.join()
+            event_bus.publish("patient_embedded", {"patient_id": "P-1"})
+
+            assert (await audit.get(timeout=1))["data"] == {"actor": "nurse1"}
+            assert [(await everything.get(timeout=1))["topic"] for _ in range(2)] == \
+                ["audit", "patient_embedded"]
+            assert audit.queue.empty()
+        finally:
+            audit.close()
+            everything.close()
+
+    asyncio.run(main())
+
+
+def test_slow_subscriber_keeps_the_newest_events(monkeypatch):
+    monkeypatch.setattr(event_bus, "SUBSCRIBER_QUEUE_SIZE", 3)
+
+    async def main():
+        sub = event_bus.subscribe()
+        try:
+            for i in range(5):
+                event_bus.publish("audit", {"n": i})
+            await asyncio.sleep(0)
+            return [(await sub.get(timeout=1))["data"]["n"] for _ in range(3)]
+        finally:
+            sub.close()
+
+    assert asyncio.run(main()) == [2, 3, 4]
+
+
+def test_closed_subscriber_is_dropped():
+    async def main():
+        sub = event_bus.subscribe()
+        sub.close()
+        event_bus.publish("audit", {})
+        await asyncio.sleep(0)
+        return sub.queue.empty()
+
+    assert asyncio.run(main())
+    assert not event_bus._subscribers
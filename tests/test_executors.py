@@ -0,0 +1,57 @@
+# tests/test_executors.py
+"""Size-bounded worker pools (app.utils.executors)."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.executors import BoundedExecutor
+
+
+@pytest.fixture
+def pool():
+    pool = BoundedExecutor("test", lambda n: ThreadPoolExecutor(max_workers=n), workers=1, queue=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_saturated_pool_rejects_with_503(pool):
+    gate = threading.Event()
+    running = [pool.submit(gate.wait, 5) for _ in range(pool.capacity)]
+
+    with pytest.raises(HTTPException) as exc:
+        pool.submit(gate.wait, 5)
+    assert exc.value.status_code == 503
+    assert "Retry-After" in exc.value.headers
+    assert pool.stats()["rejected"] == 1
+
+    gate.set()
+    for f in running:
+        f.result(timeout=5)
+
+
+def test_slots_are_released_when_tasks_finish(pool):
+    for _ in range(pool.capacity * 3):
+        pool.submit(sum, [1, 2]).result(timeout=5)
+    # the slot is released by a done-callback, just after result() returns
+    deadline = time.monotonic() + 1
+    while pool.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool.stats()["in_flight"] == 0
+    assert pool.stats()["rejected"] == 0
+
+
+def test_run_awaits_the_result(pool):
+    assert asyncio.run(pool.run(pow, 2, 10)) == 1024
+
+
+def test_pool_is_created_lazily():
+    created = []
+    pool = BoundedExecutor("lazy", lambda n: created.append(n) or ThreadPoolExecutor(n), workers=2, queue=0)
+    assert not created
+    pool.submit(int).result(timeout=5)
+    assert created == [2]
+    pool.shutdown()
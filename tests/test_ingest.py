@@ -0,0 +1,149 @@
+# tests/test_ingest.py
+"""Streaming upload ingestion and the encrypted GridFS spill (app.services.ingest)."""
+import asyncio
+
+import pytest
+
+from app.services import ingest
+
+RECORD = (
+    "Patient Name: Jane Roe\r\n"
+    "Age: 47\r\n"
+    "Gender: Female\r\n"
+    "Chief Complaint: chest pain on exertion\r\n"
+)
+
+
+class _Upload:
+    """Minimal UploadFile: read(n) over in-memory bytes."""
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._pos = 0
+
+    async def read(self, n):
+        chunk = self._data[self._pos:self._pos + n]
+        self._pos += len(chunk)
+        return chunk
+
+
+class _GridIn:
+    def __init__(self, files, filename, metadata):
+        self._id = f"file-{len(files)}"
+        self.chunks = []
+        files[self._id] = (metadata, self.chunks)
+
+    async def write(self, data):
+        self.chunks.append(bytes(data))
+
+    async def close(self):
+        pass
+
+
+class _GridOut:
+    def __init__(self, metadata, data, chunk_size):
+        self.metadata = metadata
+        self._pieces = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    async def readchunk(self):
+        return self._pieces.pop(0) if self._pieces else b""
+
+
+class _Bucket:
+    """In-memory stand-in for AsyncIOMotorGridFSBucket."""
+
+    # GridFS chunk boundaries do not line up with the frames ingest writes
+    chunk_size = 1000
+
+    def __init__(self):
+        self.files = {}
+
+    def open_upload_stream(self, filename, metadata=None):
+        return _GridIn(self.files, filename, metadata)
+
+    async def open_download_stream(self, file_id):
+        metadata, chunks = self.files[file_id]
+        return _GridOut(metadata, b"".join(chunks), self.chunk_size)
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    bucket = _Bucket()
+    monkeypatch.setattr(ingest, "_bucket", lambda: bucket)
+    return bucket
+
+
+def _ingest(data: bytes):
+    return asyncio.run(ingest.ingest_upload(_Upload(data), "P-1"))
+
+
+def test_small_upload_stays_inline(bucket):
+    result = _ingest(RECORD.encode())
+    assert result["text"] == RECORD
+    assert result["file_id"] is None
+    assert result["fields"]["patient_name"].strip() == "Jane Roe"
+    assert not bucket.files
+
+
+def test_large_upload_spills_encrypted_and_reads_back(bucket):
+    filler = "".join(f"Note {i}: vitals stable, patient resting.\n" for i in range(12000))
+    body = RECORD + filler
+    assert len(body) > ingest.INLINE_TEXT_LIMIT
+
+    result = _ingest(body.encode())
+    assert result["text"] is None
+    assert result["size"] == len(body)
+    assert result["fields"]["age"] == "47"
+    assert result["head"] == body[:ingest.HEAD_CHARS]
+
+    metadata, chunks = bucket.files[result["file_id"]]
+    assert metadata["encryption"] == "aes-gcm"
+    # neither the plaintext nor the bare zlib stream reaches GridFS
+    assert b"Jane Roe" not in b"".join(chunks)
+
+    text = asyncio.run(ingest.load_stored_text(result["file_id"], result["encoding"]))
+    assert text == body
+
+
+def test_truncated_spill_is_rejected(bucket):
+    result = _ingest((RECORD * 20000).encode())
+    _, chunks = bucket.files[result["file_id"]]
+    chunks[-1] = chunks[-1][:-5]
+    with pytest.raises(ValueError):
+        asyncio.run(ingest.load_stored_text(result["file_id"]))
+
+
+def test_latin1_upload_keeps_its_encoding(bucket):
+    body = RECORD.replace("Jane Roe", "Zoë Roe") + "x" * ingest.INLINE_TEXT_LIMIT
+    result = _ingest(body.encode("latin-1"))
+    assert result["encoding"] == "latin-1"
+    assert asyncio.run(ingest.load_stored_text(result["file_id"], result["encoding"])) == body
+
+
+def _extract(text, size):
+    extractor = ingest.LineFieldExtractor()
+    for i in range(0, len(text), size):
+        extractor.feed(text[i:i + size])
+    return extractor.close()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_fields_do_not_depend_on_chunk_boundaries(size):
+    text = RECORD.replace("\r\n", "\r") + "Patient Name: Someone Else\n"
+    expected = {name: p.search(text).group(1).strip() for name, p in ingest.FIELD_PATTERNS.items()}
+    assert {k: v.strip() for k, v in _extract(text, size).items()} == expected
+
+
+def test_value_on_the_line_after_its_label():
+    fields = _extract("Patient Name:\nJohn Smith\nAge:\n52\n", 4)
+    assert fields["patient_name"].strip() == "John Smith"
+    assert fields["age"] == "52"
+
+
+def test_unterminated_line_is_bounded():
+    extractor = ingest.LineFieldExtractor()
+    for _ in range(200):
+        extractor.feed("x" * 1000)
+    assert len(extractor._partial) <= ingest.MAX_LINE_CHARS
+    extractor.feed("Age: 61")
+    assert extractor.close()["age"] == "61"
@@ -0,0 +1,95 @@
+# tests/test_login_guard.py
+"""Login backoff and client IP resolution (app.utils.login_guard)."""
+import ipaddress
+
+import pytest
+from fastapi import HTTPException, Request
+
+from app.utils import login_guard
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(login_guard.time, "monotonic", clock)
+    monkeypatch.setattr(login_guard, "_attempts", {})
+    monkeypatch.setattr(login_guard, "LOGIN_FREE_FAILURES_PER_USER", 3)
+    monkeypatch.setattr(login_guard, "LOGIN_FREE_FAILURES_PER_IP", 20)
+    monkeypatch.setattr(login_guard, "LOGIN_BACKOFF_BASE_SECONDS", 1)
+    monkeypatch.setattr(login_guard, "LOGIN_BACKOFF_MAX_SECONDS", 8)
+    return clock
+
+
+def _locked_for(username, ip):
+    try:
+        login_guard.check(username, ip)
+    except HTTPException as exc:
+        assert exc.status_code == 429
+        return int(exc.headers["Retry-After"])
+    return 0
+
+
+def test_free_failures_then_doubling_backoff(clock):
+    for _ in range(3):
+        login_guard.record_failure("alice", "10.0.0.1")
+    assert _locked_for("alice", "10.0.0.1") == 0
+
+    waits = []
+    for _ in range(5):
+        login_guard.record_failure("alice", "10.0.0.1")
+        waits.append(_locked_for("alice", "10.0.0.1"))
+    # Retry-After rounds up; capped at LOGIN_BACKOFF_MAX_SECONDS
+    assert waits == [2, 3, 5, 9, 9]
+
+    clock.now += 9
+    assert _locked_for("alice", "10.0.0.1") == 0
+
+
+def test_lockout_is_per_username_and_ip(clock):
+    for _ in range(4):
+        login_guard.record_failure("alice", "10.0.0.1")
+    assert _locked_for("alice", "10.0.0.1")
+    # the account owner elsewhere and other users on that address are unaffected
+    assert _locked_for("alice", "10.0.0.2") == 0
+    assert _locked_for("bob", "10.0.0.1") == 0
+
+
+def test_ip_is_locked_after_its_own_budget(clock):
+    for i in range(21):
+        login_guard.record_failure(f"user{i}", "10.0.0.9")
+    assert _locked_for("someone-new", "10.0.0.9")
+
+
+def test_success_clears_the_pair(clock):
+    for _ in range(4):
+        login_guard.record_failure("alice", "10.0.0.1")
+    clock.now += 5
+    login_guard.record_success("alice", "10.0.0.1")
+    login_guard.record_failure("alice", "10.0.0.1")
+    assert _locked_for("alice", "10.0.0.1") == 0
+
+
+def _request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "method": "POST", "path": "/auth/login",
+                    "headers": headers, "client": (peer, 5000)})
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(login_guard, "_trusted_proxies", [])
+    assert login_guard.client_ip(_request("203.0.113.5", "1.2.3.4")) == "203.0.113.5"
+
+
+def test_forwarded_for_from_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(login_guard, "_trusted_proxies", [ipaddress.ip_network("10.0.0.0/8")])
+    # the client can prepend anything; the right-most untrusted hop is the real one
+    request = _request("10.0.0.2", "6.6.6.6, 198.51.100.7, 10.0.0.3")
+    assert login_guard.client_ip(request) == "198.51.100.7"
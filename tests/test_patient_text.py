@@ -0,0 +1,93 @@
+# tests/test_patient_text.py
+"""Sealed patient text fields bound to their document (app.services.patient_text)."""
+import zlib
+
+import pytest
+from bson import Binary, ObjectId
+from cryptography.exceptions import InvalidTag
+
+from app.services import patient_text
+from app.services.encryption import CipherService
+
+KEY_1 = bytes(range(32))
+KEY_2 = bytes(range(32, 64))
+
+
+@pytest.fixture
+def cipher(monkeypatch):
+    cipher = CipherService({1: KEY_1})
+    monkeypatch.setattr(patient_text, "cipher", cipher)
+    return cipher
+
+
+def _legacy_seal(cipher, text):
+    # envelopes written before the _id was bound into the AAD
+    payload = patient_text.CODEC_ZLIB + zlib.compress(text.encode())
+    return Binary(cipher.encrypt(payload, b"patients.raw_text"))
+
+
+def test_seal_then_open_round_trips(cipher):
+    doc = {"raw_text": "Patient Name: Jane Roe", "cleaned_text": "Patient Name: [NAME]", "age": "47"}
+    patient_text.seal_fields(doc)
+
+    assert isinstance(doc["_id"], ObjectId)
+    assert isinstance(doc["raw_text"], bytes)
+    assert b"Jane" not in doc["raw_text"]
+    assert doc["age"] == "47"
+
+    patient_text.open_fields(doc)
+    assert doc["raw_text"] == "Patient Name: Jane Roe"
+    assert doc["cleaned_text"] == "Patient Name: [NAME]"
+
+
+def test_set_updates_are_bound_to_the_given_ids(cipher):
+    oid = ObjectId()
+    update = {"cleaned_text": "redacted"}
+    patient_text.seal_fields(update, ids=[oid])
+    assert "_id" not in update
+
+    doc = {"_id": oid, **update}
+    patient_text.open_fields(doc)
+    assert doc["cleaned_text"] == "redacted"
+
+
+def test_envelope_does_not_open_on_another_document_or_field(cipher):
+    doc = {"raw_text": "Jane Roe"}
+    patient_text.seal_fields(doc)
+
+    with pytest.raises(InvalidTag):
+        patient_text.open_fields({"_id": ObjectId(), "raw_text": doc["raw_text"]})
+    with pytest.raises(InvalidTag):
+        patient_text.open_fields({"_id": doc["_id"], "cleaned_text": doc["raw_text"]})
+
+
+def test_legacy_envelopes_and_plaintext_still_open(cipher):
+    legacy = {"_id": ObjectId(), "raw_text": _legacy_seal(cipher, "old record")}
+    bound = {"raw_text": "new record"}
+    patient_text.seal_fields(bound)
+    plain = {"_id": ObjectId(), "raw_text": "not migrated yet"}
+
+    patient_text.open_fields(legacy, bound, plain)
+    assert [legacy["raw_text"], bound["raw_text"], plain["raw_text"]] == \
+        ["old record", "new record", "not migrated yet"]
+
+
+def test_rotate_rebinds_legacy_and_old_key_envelopes(cipher, monkeypatch):
+    legacy = {"_id": ObjectId(), "raw_text": _legacy_seal(cipher, "unbound")}
+    old_key = {"raw_text": "old key"}
+    patient_text.seal_fields(old_key)
+    current = {"raw_text": "current"}
+
+    rotated = CipherService({1: KEY_1, 2: KEY_2})
+    monkeypatch.setattr(patient_text, "cipher", rotated)
+    patient_text.seal_fields(current)
+
+    changed = patient_text.rotate_fields(legacy, old_key, current)
+    assert changed == [legacy, old_key]
+    assert rotated.key_id(legacy["raw_text"]) == 2
+    assert rotated.key_id(old_key["raw_text"]) == 2
+    # the re-sealed envelope is now bound to its _id
+    rotated.decrypt(legacy["raw_text"], f"patients.{legacy['_id']}.raw_text".encode())
+
+    patient_text.open_fields(legacy, old_key)
+    assert (legacy["raw_text"], old_key["raw_text"]) == ("unbound", "old key")
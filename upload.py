@@ -1,8 +1,14 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends
 from datetime import datetime
-from app.db import patients_collection
+from app import db_async
 from app.auth import require_role
-import re
+from app.services.clinical_extractor import extract_clinical_fields
+from app.services.ingest import FIELD_PATTERNS, ingest_upload
+from app.services.patient_text import seal_fields
+from app.utils import executors
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter(prefix="/patients", tags=["Patients"])
@@ -10,12 +16,7 @@ router = APIRouter(prefix="/patients", tags=["Patients"])
 
 # 🔹 FIELD EXTRACTION
 def extract_fields(text: str):
-    return {
-        "patient_name": re.search(r"Patient Name:\s*([A-Za-z ]+)", text, re.IGNORECASE),
-        "age": re.search(r"Age:\s*(\d+)", text, re.IGNORECASE),
-        "gender": re.search(r"Gender:\s*(Male|Female|Other)", text, re.IGNORECASE),
-        "chief_complaint": re.search(r"Chief Complaint:\s*([^A-Z]+)", text, re.IGNORECASE),
-    }
+    return {name: pattern.search(text) for name, pattern in FIELD_PATTERNS.items()}
 
 
 @router.post("/upload")
@@ -24,33 +25,44 @@ async def upload_patient_record(
     file: UploadFile = File(...),
     user=Depends(require_role("doctor"))
 ):
-    # 1️⃣ Read uploaded file
-    text = (await file.read()).decode("utf-8")
+    # 1️⃣ Stream uploaded file (fields are extracted line by line as it arrives)
+    result = await ingest_upload(file, patient_id)
 
-    # 2️⃣ Extract dashboard fields
-    fields = extract_fields(text)
-
-    # 🔍 DEBUG (KEEP FOR NOW)
-    print("🧪 EXTRACTED FIELDS:", {
-        k: v.group(1) if v else None for k, v in fields.items()
-    })
+    # 2️⃣ Dashboard fields
+    fields = result["fields"]
+    age = int(fields["age"]) if fields["age"] else None
+    logger.debug("extracted fields for %s: %s", patient_id, sorted(k for k, v in fields.items() if v))
 
     # 3️⃣ Store in MongoDB
-    patients_collection.insert_one({
+    doc = {
         "patient_id": patient_id,
 
-        "patient_name": fields["patient_name"].group(1) if fields["patient_name"] else None,
-        "age": int(fields["age"].group(1)) if fields["age"] else None,
-        "gender": fields["gender"].group(1) if fields["gender"] else None,
-        "chief_complaint": fields["chief_complaint"].group(1) if fields["chief_complaint"] else None,
+        "patient_name": fields["patient_name"],
+        "age": age,
+        "gender": fields["gender"],
+        "chief_complaint": fields["chief_complaint"],
 
-        "original_text": text,
+        # structured, non-PHI clinical fields extracted once at upload
+        "clinical": await executors.redaction.run(extract_clinical_fields, {
+            "original_text": result["text"] or result["head"],
+            "age": age,
+            "chief_complaint": fields["chief_complaint"]
+        }),
         "uploaded_by": user["username"],
         "status": "uploaded",
         "created_at": datetime.utcnow()
-    })
+    }
+    if result["file_id"] is not None:
+        doc.update(
+            text_file_id=result["file_id"],
+            text_encoding=result["encoding"],
+            text_size=result["size"]
+        )
+    else:
+        doc["original_text"] = result["text"]
+    seal_fields(doc)
 
-    print("🟢 INSERTED PATIENT:", patient_id)
+    await db_async.patients_collection.insert_one(doc)
 
     return {
         "message": "Patient record uploaded",
@@ -1,19 +1,38 @@
+import hashlib
 import logging
 from sentence_transformers import SentenceTransformer
 import uuid
+from collections import defaultdict
+from app.services.clinical_extractor import EXTRACTOR_VERSION
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "all-MiniLM-L6-v2"
+# bump when the model or its encode settings change; every stored fingerprint then goes stale
+MODEL_VERSION = f"{MODEL_NAME}@1"
+
+
+def fingerprint(text: str) -> str:
+    """Identity of a vector's inputs: source text, extractor version and model version.
+    A vector whose stored fingerprint still matches does not need re-encoding."""
+    h = hashlib.sha256(f"{MODEL_VERSION}\0{EXTRACTOR_VERSION}\0".encode())
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
 class VectorStore:
     def __init__(self):
         # load model defensively — if loading fails, keep None and log error
         try:
-            self.model = SentenceTransformer("all-MiniLM-L6-v2")
+            self.model = SentenceTransformer(MODEL_NAME)
         except Exception as e:
             logger.exception("Failed to load sentence transformer model")
             self.model = None
 
         self.vectors = []  # in-memory Vector DB
+        # lookup indexes over self.vectors (kept in sync by store())
+        self._by_id = {}
+        self._by_patient = defaultdict(list)
 
     def embed(self, text: str):
         if not self.model:
@@ -28,13 +47,36 @@ class VectorStore:
             raise RuntimeError("Embedding generation failed: %s" % str(e))
 
     def store(self, patient_id: str, text: str, metadata: dict):
-        embedding = self.embed(text)
+        return self._add(patient_id, text, metadata, self.embed(text))
+
+    def store_many(self, items, batch_size: int = 32):
+        """Batch variant of store(): items are (patient_id, text, metadata) tuples.
+        All texts are encoded in batched model calls; returns the vector_ids in order.
+        """
+        if not items:
+            return []
+        if not self.model:
+            raise RuntimeError("Embedding model not available. Check server logs for load error.")
+
+        try:
+            embeddings = self.model.encode([text for _, text, _ in items], batch_size=batch_size)
+        except Exception as e:
+            logger.exception("Error while computing batch embeddings")
+            raise RuntimeError("Embedding generation failed: %s" % str(e))
+
+        return [
+            self._add(patient_id, text, metadata, emb.tolist() if hasattr(emb, "tolist") else list(emb))
+            for (patient_id, text, metadata), emb in zip(items, embeddings)
+        ]
+
+    def _add(self, patient_id: str, text: str, metadata: dict, embedding):
         vector_id = f"VEC-{uuid.uuid4().hex[:10]}"
 
         record = {
             "vector_id": vector_id,
             "patient_id": patient_id,
             "embedding": embedding,
+            "fingerprint": fingerprint(text),
             "metadata": {
                 **metadata,
                 "text": text
@@ -42,16 +84,29 @@ class VectorStore:
         }
 
         self.vectors.append(record)
+        self._by_id[vector_id] = record
+        self._by_patient[patient_id].append(record)
         return vector_id
 
     def search(self, patient_id: str, top_k=3):
         """Return the top_k vectors for a patient (by insertion order fallback).
         Backwards compatible helper.
         """
-        return [
-            v for v in self.vectors
-            if v["patient_id"] == patient_id
-        ][:top_k]
+        return self._by_patient.get(patient_id, [])[:top_k]
+
+    def version(self, patient_id: str) -> str:
+        """Changes whenever a vector is stored for patient_id (cache key component)."""
+        records = self._by_patient.get(patient_id)
+        return f"{len(records)}:{records[-1]['vector_id']}" if records else "0"
+
+    def is_fresh(self, vector_id, text_fingerprint: str) -> bool:
+        """True when vector_id is held here and was built from inputs with this fingerprint."""
+        record = self._by_id.get(vector_id)
+        return record is not None and record.get("fingerprint") == text_fingerprint
+
+    def get_many(self, vector_ids):
+        """Batch lookup by vector_id -> record (missing ids are omitted)."""
+        return {vid: self._by_id[vid] for vid in vector_ids if vid in self._by_id}
 
     def _cosine_sim(self, a, b):
         # simple cosine similarity for two equal-length lists
@@ -73,7 +128,7 @@ class VectorStore:
         q_emb = self.embed(query_text)
 
         # compute similarity for vectors matching patient_id
-        candidates = [v for v in self.vectors if v["patient_id"] == patient_id]
+        candidates = self._by_patient.get(patient_id, [])
         scored = []
         for v in candidates:
             emb = v.get("embedding")